@@ -0,0 +1,326 @@
+# Local stand-in for the RemoteIoT portal used by the benchmark harness
+#
+# Reproduces the login form, device list export, batch job dialog and jobs CSV
+# export at the same absolute XPaths the automation scripts use, plus the HTTP
+# endpoints of the direct transport. Response latency, job completion time and
+# fleet size are configurable.
+import io
+import re
+import csv
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+SESSION_COOKIE = "MOCKSESSION"
+
+# Element id -> absolute XPath the scripts use to reach it. The dashboard DOM is
+# generated from these so the scripts' locators resolve exactly as on the portal.
+DASHBOARD_ELEMENTS = [
+    ("batch-jobs-menu", "/html/body/div[1]/div/div[1]/div/div[4]/div[3]/span/span[2]", "Batch Jobs"),
+    ("devices-menu", "/html/body/div[1]/div/div[2]/div/div[2]/div/div/div/div[1]/div/div[1]/div/div/div[2]/div/div[5]/div", "Devices menu"),
+    ("jobs-menu", "/html/body/div[1]/div/div[2]/div/div[2]/div/div/div/div[1]/div/div/div[2]/div/div[5]/div", ""),
+    ("jobs-menu-button", "/html/body/div[1]/div/div[2]/div/div[2]/div/div/div/div[1]/div/div/div[2]/div/div[5]/div/span", "Jobs menu"),
+]
+MENU_ITEMS = 14
+DIALOG_ROOT = "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[1]/div/table/tbody"
+DIALOG_ELEMENTS = [
+    ("maximize", "/html/body/div[2]/div[3]/div/div/div[2]/div[1]", "[ ]"),
+    ("job-name", DIALOG_ROOT + "/tr[1]/td[3]/input", None),
+    ("available", DIALOG_ROOT + "/tr[5]/td[3]/div/div/div[1]/div/select[1]", None),
+    ("add-devices", DIALOG_ROOT + "/tr[5]/td[3]/div/div/div[1]/div/div[2]/div[1]", "&gt;&gt;"),
+    ("selected", DIALOG_ROOT + "/tr[5]/td[3]/div/div/div[1]/div/select[2]", None),
+    ("search", DIALOG_ROOT + "/tr[5]/td[3]/div/div/div[3]/div/div[1]/div/input", None),
+    ("search-icon", DIALOG_ROOT + "/tr[5]/td[3]/div/div/div[3]/div/div[1]/div/div/span", "Search"),
+    ("command-option", DIALOG_ROOT + "/tr[7]/td[3]/div/span[2]/label", "Command"),
+    ("script-option", DIALOG_ROOT + "/tr[7]/td[3]/div/span[1]/label", "Execute script"),
+    ("script-box", DIALOG_ROOT + "/tr[8]/td[3]/div", None),
+    ("script", DIALOG_ROOT + "/tr[8]/td[3]/div/div/div/div/input", None),
+    ("command", DIALOG_ROOT + "/tr[8]/td[3]/textarea", None),
+    ("submit", "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[3]/div/div/div/div/div[3]/div", "Submit"),
+]
+
+STEP = re.compile(r"^([a-z]+)(?:\[(\d+)\])?$")
+
+
+class Node:
+    def __init__(self, tag):
+        self.tag = tag
+        self.attrs = {}
+        self.children = []
+        self.text = ""
+
+    def child(self, tag, index):
+        matches = [c for c in self.children if c.tag == tag]
+        while len(matches) < index:
+            filler = Node(tag)
+            self.children.append(filler)
+            matches.append(filler)
+        return matches[index - 1]
+
+    def render(self):
+        attrs = "".join(f' {k}="{v}"' for k, v in self.attrs.items())
+        if self.tag == "input":
+            return f"<input{attrs}>"
+        inner = self.text + "".join(c.render() for c in self.children)
+        return f"<{self.tag}{attrs}>{inner}</{self.tag}>"
+
+
+def build_tree(body, elements):
+    for element_id, xpath, text in elements:
+        node = body
+        for step in xpath.split("/")[3:]:  # skip "", "html", "body"
+            tag, index = STEP.match(step).groups()
+            node = node.child(tag, int(index or 1))
+        node.attrs["id"] = element_id
+        if text:
+            node.text = text
+
+
+def dashboard_body():
+    body = Node("body")
+    build_tree(body, DASHBOARD_ELEMENTS)
+    # The jobs view and overlay ids the scripts look up with //*[@id=...]
+    body.child("div", 1).attrs["id"] = "portal-982480788"
+    body.child("div", 1).child("div", 1).child("div", 1).attrs["id"] = "dashboard-menu"
+
+    overlays = body.child("div", 2)
+    overlays.attrs["id"] = "portal-982480788-overlays"
+    menu = overlays.child("div", 2)
+    menu.attrs["id"] = "popup-menu"
+    menu.attrs["style"] = "display:none;position:fixed;top:10px;left:600px;background:#eee"
+    items = menu.child("div", 1).child("div", 1)
+    for index in range(1, MENU_ITEMS + 1):
+        item = items.child("span", index)
+        item.attrs["class"] = "menu-item"
+        item.attrs["data-index"] = str(index)
+        item.attrs["style"] = "display:block"
+        item.child("span", 1).text = f"Item {index}"
+
+    dialog = overlays.child("div", 3)
+    dialog.attrs["style"] = "display:none;position:fixed;top:10px;left:900px;background:#fff"
+    build_tree(body, DIALOG_ELEMENTS)
+    dialog.attrs["id"] = "job-dialog"
+    return body
+
+
+LOGIN_PAGE = """<!DOCTYPE html><html><head><title>Login</title></head><body>
+<form method="post" action="login">
+<input type="text" name="username"><input type="password" name="password">
+<button type="submit">Login</button>
+</form></body></html>"""
+
+DASHBOARD_SCRIPT = """
+var menuContext = null;
+function $(id) { return document.getElementById(id); }
+function openMenu(context, event) { event.stopPropagation(); menuContext = context; $('popup-menu').style.display = 'block'; }
+function closeMenu() { $('popup-menu').style.display = 'none'; }
+$('devices-menu').onclick = function (e) { openMenu('devices', e); };
+$('jobs-menu').onclick = function (e) { openMenu('jobs', e); };
+$('batch-jobs-menu').onclick = function () {};
+document.querySelectorAll('.menu-item').forEach(function (item) {
+    item.onclick = function (e) {
+        e.stopPropagation();
+        var index = parseInt(item.getAttribute('data-index'));
+        closeMenu();
+        if (menuContext === 'devices' && index === 14) { window.location.href = 'export/devices.csv'; }
+        if (menuContext === 'jobs' && index === 5) { window.location.href = 'export/jobs.csv'; }
+        if (menuContext === 'jobs' && index === 1) { openDialog(); }
+    };
+});
+function openDialog() {
+    ['job-name', 'search', 'script', 'command'].forEach(function (id) { $(id).value = ''; });
+    $('available').innerHTML = ''; $('selected').innerHTML = '';
+    $('script-box').style.display = 'none'; $('command').style.display = 'block';
+    $('job-dialog').style.display = 'block';
+}
+$('available').multiple = true; $('selected').multiple = true;
+$('available').size = 8; $('selected').size = 8;
+$('search-icon').onclick = function () {
+    var query = $('search').value.replace(/^"|"$/g, '');
+    fetch('api/search?q=' + encodeURIComponent(query)).then(function (r) { return r.json(); }).then(function (names) {
+        $('available').innerHTML = names.map(function (n) { return '<option>' + n + '</option>'; }).join('');
+    });
+};
+$('available').addEventListener('keydown', function (e) {
+    if ((e.ctrlKey || e.metaKey) && e.key === 'a') {
+        e.preventDefault();
+        Array.prototype.forEach.call($('available').options, function (o) { o.selected = true; });
+    }
+});
+$('add-devices').onclick = function () {
+    Array.prototype.slice.call($('available').selectedOptions).forEach(function (o) { $('selected').appendChild(o); });
+};
+$('script-option').onclick = function () { $('script-box').style.display = 'block'; $('command').style.display = 'none'; };
+$('command-option').onclick = function () { $('script-box').style.display = 'none'; $('command').style.display = 'block'; };
+var popup = null;
+$('script').addEventListener('input', function () {
+    if (!popup) {
+        popup = document.createElement('div');
+        popup.className = 'v-filterselect-suggestpopup';
+        popup.textContent = 'eru_misc.sh';
+        document.body.appendChild(popup);
+    }
+});
+$('script').addEventListener('keydown', function (e) {
+    if (e.key === 'Enter' && popup) { $('script').value = popup.textContent; popup.remove(); popup = null; }
+});
+$('maximize').onclick = function () { $('job-dialog').style.left = '0px'; };
+$('submit').onclick = function () {
+    var scriptMode = $('script-box').style.display !== 'none';
+    var payload = {
+        name: $('job-name').value,
+        devices: Array.prototype.map.call($('selected').options, function (o) { return o.value; })
+    };
+    if (scriptMode) { payload.script = $('script').value; } else { payload.command = $('command').value; }
+    fetch('api/jobs', {method: 'POST', headers: {'Content-Type': 'application/json'}, body: JSON.stringify(payload)})
+        .then(function () { $('job-dialog').style.display = 'none'; });
+};
+document.body.onclick = closeMenu;
+"""
+
+
+class PortalState:
+    def __init__(self, fleet_size=200, online_ratio=0.8, job_latency=2.0, expected_version="1.0.0",
+                 failure_ratio=0.05, seed=1):
+        rng = random.Random(seed)
+        self.devices = [(f"device-{i:05d}", "Online" if rng.random() < online_ratio else "Offline")
+                        for i in range(fleet_size)]
+        self.job_latency = job_latency
+        self.expected_version = expected_version
+        self.failure_ratio = failure_ratio
+        self.rng = rng
+        self.jobs = []
+        self.lock = threading.Lock()
+
+    def search(self, query):
+        names = [name.strip() for name in query.split("|") if name.strip()]
+        wanted = set(names)
+        return [name for name, _ in self.devices if name in wanted]
+
+    def add_job(self, payload):
+        created = time.time()
+        with self.lock:
+            for device in payload.get("devices", []):
+                failed = self.rng.random() < self.failure_ratio
+                self.jobs.append({"Job Name": payload.get("name", ""), "Device Name": device,
+                                  "created": created, "failed": failed, "command": "command" in payload})
+
+    def devices_csv(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["Device Name", "Status", "Group"])
+        for name, status in self.devices:
+            writer.writerow([name, status, "bench"])
+        return buffer.getvalue().encode()
+
+    def jobs_csv(self):
+        now = time.time()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["Job Name", "Device Name", "Status", "Result"])
+        with self.lock:
+            for job in self.jobs:
+                if now - job["created"] < self.job_latency:
+                    writer.writerow([job["Job Name"], job["Device Name"], "Pending", ""])
+                elif job["failed"]:
+                    writer.writerow([job["Job Name"], job["Device Name"], "Failed", ""])
+                elif job["command"]:
+                    writer.writerow([job["Job Name"], job["Device Name"], "Executed", self.expected_version])
+                else:
+                    # Script jobs report the script's output, not a version
+                    writer.writerow([job["Job Name"], job["Device Name"], "Executed", "done"])
+        return buffer.getvalue().encode()
+
+
+def make_handler(state, latency):
+    dashboard = ("<!DOCTYPE html><html><head><title>RemoteIoT mock</title></head>"
+                 + dashboard_body().render().replace("</body>", f"<script>{DASHBOARD_SCRIPT}</script></body>")
+                 + "</html>")
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body=b"", content_type="text/html", headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _logged_in(self):
+            return f"{SESSION_COOKIE}=" in self.headers.get("Cookie", "")
+
+        def _csv(self, prefix, body):
+            filename = datetime.now().strftime(f"{prefix}_%Y%m%d_%H%M%S_%f.csv")
+            self._send(200, body, "text/csv", {"Content-Disposition": f'attachment; filename="{filename}"'})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/portal/" and "link=login" in url.query:
+                return self._send(200, LOGIN_PAGE.encode())
+            if not self._logged_in():
+                return self._send(303, headers={"Location": "/portal/?link=login"})
+
+            time.sleep(latency)
+            if url.path == "/portal/":
+                return self._send(200, dashboard.encode())
+            if url.path == "/portal/api/search":
+                query = parse_qs(url.query).get("q", [""])[0]
+                return self._send(200, json.dumps(state.search(query)).encode(), "application/json")
+            if url.path in ("/portal/export/devices.csv", "/portal/api/devices/export"):
+                return self._csv("Devices", state.devices_csv())
+            if url.path in ("/portal/export/jobs.csv", "/portal/api/jobs/export"):
+                return self._csv("jobs", state.jobs_csv())
+            self._send(404)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            if url.path in ("/portal/login", "/portal/api/login"):
+                return self._send(303, headers={"Location": "/portal/",
+                                                "Set-Cookie": f"{SESSION_COOKIE}=1; Path=/"})
+            if not self._logged_in():
+                return self._send(403)
+            if url.path == "/portal/api/jobs":
+                state.add_job(json.loads(body or b"{}"))
+                return self._send(200, b'{"status": "created"}', "application/json")
+            self._send(404)
+
+    return Handler
+
+
+def start_mock_portal(host="127.0.0.1", port=0, latency=0.1, **state_options):
+    """Starts the mock portal in a background thread and returns (server, base_url, state)."""
+    state = PortalState(**state_options)
+    server = ThreadingHTTPServer((host, port), make_handler(state, latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-portal", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}/portal/", state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the RemoteIoT portal.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds added to every portal response")
+    parser.add_argument("--job-latency", type=float, default=2.0, help="seconds until a job reports its result")
+    parser.add_argument("--fleet-size", type=int, default=200)
+    args = parser.parse_args()
+
+    server, base_url, _ = start_mock_portal(port=args.port, latency=args.latency,
+                                            fleet_size=args.fleet_size, job_latency=args.job_latency)
+    print(f"Mock portal running at {base_url}?link=login (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
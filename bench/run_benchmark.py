@@ -0,0 +1,187 @@
+# Offline end-to-end benchmark of the automation stages against the mock portal
+#
+# Starts bench/mock_portal.py, writes a throwaway config.json/credentials.conf
+# pointing the scripts at it, runs fetch -> execute -> verify in one browser
+# session and reports devices per minute plus p50/p95 latency per step.
+#
+#   python bench/run_benchmark.py --fleet-size 200 --latency 0.2 --json result.json
+#   python bench/run_benchmark.py --baseline result.json   # fail on regressions
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from mock_portal import start_mock_portal  # noqa: E402
+
+
+def write_workdir(base_url, args):
+    """Creates a working directory with config.json and credentials.conf for the mock portal."""
+    workdir = tempfile.mkdtemp(prefix="remote_iot_bench_")
+    download_dir = os.path.expanduser(args.download_dir)
+    transport = "http" if args.transport == "http" else "browser"
+    config = {
+        "script_1": {"download_path": download_dir, "save_path": workdir, "download_timeout": 60},
+        "script_2": {
+            "input_path": os.path.join(workdir, "Tracking_online_Devices.xlsx"),
+            "output_path": os.path.join(workdir, "Script_Execution_Device_List.xlsx"),
+            "device_count": args.fleet_size,
+            "batch_delay": 0,
+            "workers": args.workers,
+            "submit_interval": 0,
+        },
+        "script_3": {
+            "input_path": os.path.join(workdir, "Tracking_online_Devices.xlsx"),
+            "download_dir": download_dir,
+            "new_output_path": os.path.join(workdir, "Final Execution List.xlsx"),
+            "result_deadline": max(30, args.job_latency * 5),
+            "poll_initial_delay": 1,
+            "poll_max_delay": 5,
+        },
+        "portal": {
+            "base_url": base_url,
+            "transport": {"download_device_list": transport, "create_batch_job": transport, "export_jobs": transport},
+        },
+        "store": {"path": os.path.join(workdir, "remote_iot_store.sqlite"), "excel_report": True},
+        "profiling": {"enabled": True, "trace_dir": os.path.join(workdir, "traces")},
+    }
+    with open(os.path.join(workdir, "config.json"), "w") as f:
+        json.dump(config, f, indent=2)
+    with open(os.path.join(workdir, "credentials.conf"), "w") as f:
+        f.write("username=bench@example.com\npassword=bench\n")
+    return workdir
+
+
+def run(args):
+    server, base_url, state = start_mock_portal(latency=args.latency, fleet_size=args.fleet_size,
+                                                job_latency=args.job_latency)
+    workdir = write_workdir(base_url, args)
+    # The stage modules read config.json from the working directory on import
+    os.chdir(workdir)
+    import remote_iot_sub_automation_fetch_devices_status as fetch_stage
+    import remote_iot_sub_automation_Script_execution as execution_stage
+    import remote_iot_sub_automation_command_status as status_stage
+    import remote_iot_profiling as profiling
+    from remote_iot_browser import create_driver, browser_usage
+
+    profiling.start_trace(fetch_stage.config["profiling"], "benchmark")
+    stage_seconds = {}
+    driver = create_driver(headless=True, browser_config=fetch_stage.config.get("browser"), profile=args.browser_profile)
+    try:
+        creds = fetch_stage.load_credentials()
+        if not fetch_stage.login(driver, creds["username"], creds["password"]):
+            raise RuntimeError("Login to the mock portal failed")
+
+        start = time.perf_counter()
+        fetch = fetch_stage.run_stage(driver)
+        stage_seconds["fetch"] = time.perf_counter() - start
+        if not fetch.ok:
+            raise RuntimeError("Device list stage produced no tracking list")
+
+        driver.refresh()
+        start = time.perf_counter()
+        execution = execution_stage.run_stage(driver)
+        stage_seconds["execute"] = time.perf_counter() - start
+
+        driver.refresh()
+        start = time.perf_counter()
+        verification = status_stage.run_stage(driver)
+        stage_seconds["verify"] = time.perf_counter() - start
+    finally:
+        usage = browser_usage(driver)
+        driver.quit()
+        server.shutdown()
+
+    total_seconds = sum(stage_seconds.values())
+    executed = len(execution.executed_devices)
+    return {
+        "fleet_size": args.fleet_size,
+        "latency": args.latency,
+        "transport": args.transport,
+        "workers": args.workers,
+        "browser_profile": args.browser_profile,
+        "executed_devices": executed,
+        "verified": verification.ok,
+        "stage_seconds": stage_seconds,
+        "execute_devices_per_minute": executed / (stage_seconds["execute"] / 60) if stage_seconds["execute"] else 0,
+        "pipeline_devices_per_minute": executed / (total_seconds / 60) if total_seconds else 0,
+        "browser_usage": usage,
+        "steps": profiling.summary(),
+    }
+
+
+def print_report(result):
+    print(f"\nFleet {result['fleet_size']} devices, latency {result['latency']}s, "
+          f"transport {result['transport']}, workers {result['workers']}, browser {result.get('browser_profile', '-')}")
+    for stage, seconds in result["stage_seconds"].items():
+        print(f"  {stage:<8} {seconds:8.2f}s")
+    print(f"  Executed devices:   {result['executed_devices']}")
+    print(f"  Execute throughput: {result['execute_devices_per_minute']:.1f} devices/min")
+    print(f"  Pipeline throughput: {result['pipeline_devices_per_minute']:.1f} devices/min")
+    if result.get("browser_usage"):
+        usage = result["browser_usage"]
+        print(f"  Browser:            {usage['rss_mb']} MB in {usage['processes']} processes, {usage['cpu_seconds']}s CPU")
+    print()
+
+    width = max([len(row["step"]) for row in result["steps"]] + [4])
+    print(f"  {'Step':<{width}}  {'Count':>5}  {'p50 s':>7}  {'p95 s':>7}  {'Max s':>7}")
+    for row in result["steps"]:
+        print(f"  {row['step']:<{width}}  {row['count']:>5}  {row['p50']:>7.3f}  {row['p95']:>7.3f}  {row['max']:>7.3f}")
+
+
+def compare(result, baseline, max_regression):
+    """Prints changes against a previous result and returns False if throughput or a step p95 regressed."""
+    ok = True
+    old, new = baseline["pipeline_devices_per_minute"], result["pipeline_devices_per_minute"]
+    if old and new < old * (1 - max_regression):
+        print(f"REGRESSION: pipeline throughput {old:.1f} -> {new:.1f} devices/min")
+        ok = False
+
+    old_steps = {row["step"]: row for row in baseline["steps"]}
+    for row in result["steps"]:
+        previous = old_steps.get(row["step"])
+        if previous and previous["p95"] > 0 and row["p95"] > previous["p95"] * (1 + max_regression):
+            print(f"REGRESSION: {row['step']} p95 {previous['p95']:.3f}s -> {row['p95']:.3f}s")
+            ok = False
+    if ok:
+        print("No regressions against the baseline.")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the RemoteIoT automation against a local mock portal.")
+    parser.add_argument("--fleet-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds added to every portal response")
+    parser.add_argument("--job-latency", type=float, default=2.0, help="seconds until a job reports its result")
+    parser.add_argument("--transport", choices=["browser", "http"], default="browser")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--browser-profile", default="lean", help="browser profile from remote_iot_browser.PROFILES")
+    parser.add_argument("--download-dir", default="~/Downloads", help="folder Chrome saves exports to")
+    parser.add_argument("--json", help="write the result to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json result")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args()
+    # run() switches into a temporary working directory
+    args.json = os.path.abspath(args.json) if args.json else None
+    args.baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    result = run(args)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(result, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,78 @@
-import time
+import os
+import json
+import asyncio
+import argparse
 import subprocess
 
+from remote_iot_logging import setup_logging, new_run_id, RUN_ID_ENV
+from remote_iot_stage_cache import STAGES, forced_stages, cached_stage
+
 # Define script paths
 script1 = r"C:\Users\jyarrams\PycharmProjects\IoT_Security_RemoteIoT_Automation\remote_iot_sub_automation_fetch_devices_status.py"
 script2 = r"C:\Users\jyarrams\PycharmProjects\IoT_Security_RemoteIoT_Automation\remote_iot_sub_automation_Script_execution.py"
 script3 = r"C:\Users\jyarrams\PycharmProjects\IoT_Security_RemoteIoT_Automation\remote_iot_sub_automation_command_status.py"
 
 # Function to execute each script sequentially
-def run_script(script_path):
+def run_script(script_path, *args):
     print(f"Running script: {script_path}")
-    result = subprocess.run(["python", script_path], capture_output=True, text=True)
-    output = result.stdout.strip()
-    print(f"Output: {output}")
-    return output
+    # Stream the child's output (including its log lines) as it runs instead of buffering it
+    output_lines = []
+    with subprocess.Popen(["python", script_path, *args], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True) as process:
+        for line in process.stdout:
+            print(line, end="", flush=True)
+            output_lines.append(line)
+    return "".join(output_lines).strip()
+
+def run_stage_script(config, forced, stage, script_path, marker, *args):
+    """Runs one stage script unless its last output can be reused; True when the stage is done."""
+    if cached_stage(config, stage, forced) is not None:
+        print(f"Skipping the {stage} stage, nothing it depends on changed since its last run.")
+        return True
+    return marker in run_script(script_path, *args)
 
-def run_scripts_sequentially():
-    output1 = run_script(script1)
-    if "1st_script_completed" in output1:
-        time.sleep(5)
-        output2 = run_script(script2)
-        if "2nd_script_completed" in output2:
-            time.sleep(5)
-            output3 = run_script(script3)
-            if "3rd_script_completed" in output3:
+def run_scripts_sequentially(resume=False, force=()):
+    with open("config.json", "r") as config_file:
+        config = json.load(config_file)
+    forced = forced_stages(force)
+    if run_stage_script(config, forced, "fetch", script1, "1st_script_completed"):
+        if run_stage_script(config, forced, "execute", script2, "2nd_script_completed", *(["--resume"] if resume else [])):
+            if run_stage_script(config, forced, "verify", script3, "3rd_script_completed"):
                 print("All scripts executed successfully!")
 
-# Execute scripts sequentially
-run_scripts_sequentially()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the RemoteIoT automation pipeline.")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run the stages as asyncio tasks sharing one browser session instead of separate scripts")
+    parser.add_argument("--tenants", action="store_true",
+                        help="run the pipeline for every account under tenants.accounts in config.json in parallel")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip devices already submitted by the last, interrupted execution run")
+    parser.add_argument("--retry", action="store_true",
+                        help="re-run execution and verification for the devices due in the retry queue only")
+    parser.add_argument("--force", action="append", choices=STAGES + ("all",), default=[],
+                        help="rerun this stage and the stages after it even if their inputs are unchanged (repeatable)")
+    args = parser.parse_args()
+    # The stage scripts, in this process or as child processes, log under one run id
+    os.environ[RUN_ID_ENV] = new_run_id()
 
+    if args.tenants:
+        from remote_iot_tenants import run_tenants
+        setup_logging("tenants")
+        with open("config.json", "r") as config_file:
+            results = run_tenants(json.load(config_file), resume=args.resume, force=args.force)
+        if results and all(results.values()):
+            print("All scripts executed successfully!")
+    elif args.retry:
+        from remote_iot_orchestrator import run_retries
+        results = asyncio.run(run_retries())
+        if "verify" in results and results["verify"].ok:
+            print("All scripts executed successfully!")
+    elif args.in_process:
+        # Imported here because the stage modules load config.json on import
+        from remote_iot_orchestrator import run_pipeline
+        results = asyncio.run(run_pipeline(resume=args.resume or None, force=args.force))
+        if "verify" in results and results["verify"].ok:
+            print("All scripts executed successfully!")
+    else:
+        # Execute scripts sequentially
+        run_scripts_sequentially(resume=args.resume, force=args.force)
@@ -0,0 +1,86 @@
+# Adaptive (AIMD) batch sizing and spacing for the execution stage
+import logging
+import threading
+
+
+class AdaptiveBatchScheduler:
+    """Hands out device batches, tuning batch size and inter-batch delay from observed submissions.
+
+    Like TCP congestion control: every fast, successful submission grows the
+    batch by `increase` devices and shortens the delay by `delay_step`
+    seconds; an error or a submission slower than `target_latency` halves
+    the batch (times `decrease`) and doubles the delay. Both stay within the
+    configured bounds, so equal bounds give the old fixed schedule.
+    Safe to share between worker threads.
+    """
+
+    def __init__(self, devices, batch_size, delay, min_batch_size=None, max_batch_size=None, min_delay=None,
+                 max_delay=None, target_latency=60, increase=1, decrease=0.5, delay_step=5, first_batch_number=1):
+        self.min_batch_size = max(1, min_batch_size or batch_size)
+        self.max_batch_size = max(self.min_batch_size, max_batch_size or batch_size)
+        self.min_delay = delay if min_delay is None else min_delay
+        self.max_delay = max(self.min_delay, delay if max_delay is None else max_delay)
+        self.target_latency = target_latency
+        self.increase = increase
+        self.decrease = decrease
+        self.delay_step = delay_step
+
+        self.batch_size = min(max(batch_size, self.min_batch_size), self.max_batch_size)
+        self.delay = min(max(delay, self.min_delay), self.max_delay)
+        self._devices = list(devices)
+        self._position = 0
+        self._next_number = first_batch_number
+        self.batch_count = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, script_config, devices, first_batch_number=1):
+        """Builds the scheduler from script_2 in config.json; without an enabled `adaptive` section the schedule is fixed."""
+        device_count = script_config["device_count"]
+        batch_size = 10 if device_count >= 100 else 5
+        delay = script_config["batch_delay"]
+        adaptive = script_config.get("adaptive", {})
+        if not adaptive.get("enabled", False):
+            return cls(devices, batch_size, delay, first_batch_number=first_batch_number)
+        return cls(devices, batch_size, delay,
+                   min_batch_size=adaptive.get("min_batch_size", 1),
+                   max_batch_size=adaptive.get("max_batch_size", batch_size),
+                   min_delay=adaptive.get("min_delay", 0),
+                   max_delay=adaptive.get("max_delay", delay),
+                   target_latency=adaptive.get("target_latency", 60),
+                   increase=adaptive.get("increase", 1),
+                   decrease=adaptive.get("decrease", 0.5),
+                   delay_step=adaptive.get("delay_step", 5),
+                   first_batch_number=first_batch_number)
+
+    def next_batch(self):
+        """Returns (batch_number, devices) for the next batch at the current size, or None when all are handed out."""
+        with self._lock:
+            if self._position >= len(self._devices):
+                return None
+            batch = self._devices[self._position:self._position + self.batch_size]
+            self._position += len(batch)
+            batch_number = self._next_number
+            self._next_number += 1
+            self.batch_count += 1
+            return batch_number, batch
+
+    def record(self, duration, ok=True):
+        """Feeds back how long a batch took and whether it succeeded, and adjusts size and delay."""
+        with self._lock:
+            previous = (self.batch_size, self.delay)
+            if ok and duration <= self.target_latency:
+                self.batch_size = min(self.max_batch_size, self.batch_size + self.increase)
+                self.delay = max(self.min_delay, self.delay - self.delay_step)
+            else:
+                self.batch_size = max(self.min_batch_size, int(self.batch_size * self.decrease))
+                self.delay = min(self.max_delay, max(self.delay, 1) * 2)
+                if (self.batch_size, self.delay) != previous:
+                    logging.info(f"Backing off after a {'slow' if ok else 'failed'} batch ({duration:.1f}s): "
+                                 f"batch size {self.batch_size}, delay {self.delay:.0f}s.")
+            return self.batch_size, self.delay
+
+    @property
+    def remaining(self):
+        with self._lock:
+            return len(self._devices) - self._position
@@ -0,0 +1,244 @@
+# Shared Chrome WebDriver setup for the RemoteIoT automation scripts
+import os
+import json
+import logging
+import threading
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import SessionNotCreatedException
+from webdriver_manager.chrome import ChromeDriverManager
+from remote_iot_profiling import span
+from remote_iot_export_capture import capture_enabled, enable_network_log
+from remote_iot_http_client import close_client
+from remote_iot_selectors import clear_cache
+
+try:
+    import psutil
+except ImportError:  # psutil is optional, browser resource use is then not measured
+    psutil = None
+
+DEFAULT_DRIVER_CACHE = "chromedriver_cache.json"
+
+# Named browser setups; browser.profile in config.json picks one and browser.profiles can add or override them
+PROFILES = {
+    # Headed, as the scripts originally ran
+    "default": {"headless": False, "arguments": [], "block": []},
+    # Headless and stripped down, to pack many sessions onto one runner
+    "lean": {
+        "headless": True,
+        "arguments": [
+            "--blink-settings=imagesEnabled=false",
+            "--disable-extensions",
+            "--disable-background-networking",
+            "--disable-component-update",
+            "--disable-default-apps",
+            "--disable-sync",
+            "--metrics-recording-only",
+            "--mute-audio",
+            "--no-first-run",
+            "--renderer-process-limit=2",
+        ],
+        "block": ["images", "fonts", "analytics"],
+    },
+    # Headed with DevTools open, for stepping through a failing flow
+    "debug": {"headless": False, "arguments": ["--auto-open-devtools-for-tabs"], "block": []},
+}
+DEFAULT_PROFILE = "lean"
+
+# URL patterns dropped via the DevTools protocol for each entry of browser.block in config.json
+BLOCKED_URL_PATTERNS = {
+    "fonts": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*fonts.googleapis.com*", "*fonts.gstatic.com*"],
+    "analytics": ["*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*hotjar.com*"],
+}
+
+_profile_lock = threading.Lock()
+_claimed_profiles = set()
+
+
+def resolve_profile(browser_config=None, profile=None, headless=None):
+    """Returns the settings of the named profile (default: browser.profile), with `headless` overriding its own."""
+    browser_config = browser_config or {}
+    profiles = {**PROFILES, **browser_config.get("profiles", {})}
+    name = profile or browser_config.get("profile", DEFAULT_PROFILE)
+    if name not in profiles:
+        logging.warning(f"Unknown browser profile '{name}', using '{DEFAULT_PROFILE}'.")
+        name = DEFAULT_PROFILE
+    settings = {"headless": False, "arguments": [], "block": [], **profiles[name], "name": name}
+    if headless is not None:
+        settings["headless"] = headless
+    settings["block"] = sorted(set(settings["block"]) | set(browser_config.get("block", [])))
+    return settings
+
+
+def build_chrome_options(headless=False, browser_config=None, arguments=()):
+    browser_config = browser_config or {}
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless")  # Run in headless mode
+    options.add_argument("--start-maximized")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--force-device-scale-factor=1")  # Forces 100% scale
+    options.add_argument("--high-dpi-support=1")  # Ensures high DPI support
+    for argument in arguments:
+        options.add_argument(argument)
+
+    profile_dir = claim_profile_dir(browser_config.get("profile_dir"))
+    if profile_dir:
+        # Warm profile: HTTP cache and cookies survive between runs
+        options.add_argument(f"--user-data-dir={profile_dir}")
+    prefs = {}
+    if "images" in browser_config.get("block", []):
+        prefs["profile.managed_default_content_settings.images"] = 2
+    if browser_config.get("download_dir"):
+        # Separate download folders keep parallel runs from picking up each other's exports
+        download_dir = os.path.abspath(os.path.expanduser(browser_config["download_dir"]))
+        os.makedirs(download_dir, exist_ok=True)
+        prefs.update({"download.default_directory": download_dir, "download.prompt_for_download": False})
+    if prefs:
+        options.add_experimental_option("prefs", prefs)
+    if capture_enabled(browser_config):
+        enable_network_log(options)
+    return options
+
+
+def claim_profile_dir(base_dir):
+    """Returns a persistent profile folder under `base_dir` that no other driver of this process uses.
+
+    Chrome refuses to open one user-data-dir twice, so worker browsers get
+    profile-1, profile-2, ... next to the main browser's profile-0.
+    """
+    if not base_dir:
+        return None
+    base_dir = os.path.abspath(os.path.expanduser(base_dir))
+    with _profile_lock:
+        index = 0
+        while os.path.join(base_dir, f"profile-{index}") in _claimed_profiles:
+            index += 1
+        profile_dir = os.path.join(base_dir, f"profile-{index}")
+        _claimed_profiles.add(profile_dir)
+    os.makedirs(profile_dir, exist_ok=True)
+    return profile_dir
+
+
+def _read_driver_cache(cache_path):
+    try:
+        with open(cache_path, "r") as cache_file:
+            path = json.load(cache_file).get("driver_path")
+        return path if path and os.path.isfile(path) else None
+    except (OSError, ValueError):
+        return None
+
+
+def resolve_driver_path(browser_config=None):
+    """Returns the chromedriver binary to start, resolving it over the network only when nothing is pinned.
+
+    Order: browser.driver_path from config.json, then the path cached by an
+    earlier run, then webdriver-manager (unless browser.offline is set), whose
+    result is cached for the next run. Returns None to let Selenium find a
+    driver itself.
+    """
+    browser_config = browser_config or {}
+    pinned = browser_config.get("driver_path")
+    if pinned:
+        return os.path.expanduser(pinned)
+
+    cache_path = os.path.expanduser(browser_config.get("driver_cache", DEFAULT_DRIVER_CACHE))
+    cached = _read_driver_cache(cache_path)
+    if cached:
+        return cached
+    if browser_config.get("offline", False):
+        logging.warning("No pinned or cached chromedriver and offline mode is set; using Selenium's own lookup.")
+        return None
+
+    try:
+        path = ChromeDriverManager().install()
+    except Exception as e:
+        logging.error(f"Could not resolve chromedriver: {e}")
+        return None
+    try:
+        with open(cache_path, "w") as cache_file:
+            json.dump({"driver_path": path}, cache_file)
+    except OSError as e:
+        logging.warning(f"Could not cache the chromedriver path: {e}")
+    return path
+
+
+def forget_cached_driver(browser_config, driver_path):
+    """Drops the cached chromedriver path if it is `driver_path`, e.g. after Chrome updated; True if it was."""
+    cache_path = os.path.expanduser((browser_config or {}).get("driver_cache", DEFAULT_DRIVER_CACHE))
+    if not driver_path or _read_driver_cache(cache_path) != driver_path:
+        return False
+    os.remove(cache_path)
+    return True
+
+
+def block_requests(driver, browser_config=None):
+    """Drops font and analytics requests listed under browser.block through the DevTools protocol."""
+    patterns = [pattern for kind in (browser_config or {}).get("block", []) for pattern in BLOCKED_URL_PATTERNS.get(kind, [])]
+    if not patterns:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    except Exception as e:
+        logging.warning(f"Could not block requests: {e}")
+
+
+def create_driver(headless=None, browser_config=None, profile=None):
+    """Starts Chrome with the named profile (see PROFILES); `headless` overrides the profile's own setting."""
+    settings = resolve_profile(browser_config, profile, headless)
+    browser_config = {**(browser_config or {}), "block": settings["block"]}
+    with span("resolve chromedriver"):
+        driver_path = resolve_driver_path(browser_config)
+    options = build_chrome_options(settings["headless"], browser_config, settings["arguments"])
+    try:
+        driver = webdriver.Chrome(service=Service(driver_path) if driver_path else Service(), options=options)
+    except SessionNotCreatedException:
+        if not forget_cached_driver(browser_config, driver_path):
+            raise
+        logging.warning("Cached chromedriver does not match the installed Chrome, resolving it again.")
+        driver_path = resolve_driver_path(browser_config)
+        driver = webdriver.Chrome(service=Service(driver_path) if driver_path else Service(), options=options)
+    block_requests(driver, browser_config)
+    logging.info(f"WebDriver initialized ({settings['name']} profile, {'headless' if settings['headless'] else 'headed'}).")
+    return driver
+
+
+def browser_usage(driver):
+    """Returns memory and CPU time summed over chromedriver and every browser process it started.
+
+    Returns None when psutil is not installed or the processes are gone.
+    """
+    process = getattr(getattr(driver, "service", None), "process", None)
+    if psutil is None or process is None:
+        return None
+    try:
+        root = psutil.Process(process.pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.Error:
+        return None
+
+    count, rss, cpu = 0, 0, 0.0
+    for proc in processes:
+        try:
+            rss += proc.memory_info().rss
+            times = proc.cpu_times()
+            cpu += times.user + times.system
+            count += 1
+        except psutil.Error:
+            continue
+    return {"processes": count, "rss_mb": round(rss / 2 ** 20, 1), "cpu_seconds": round(cpu, 2)}
+
+
+def quit_driver(driver):
+    """Logs the browser's resource use, when measurable, and quits it along with its HTTP client and cached elements."""
+    usage = browser_usage(driver)
+    if usage:
+        logging.info(f"Browser used {usage['rss_mb']} MB across {usage['processes']} processes "
+                     f"and {usage['cpu_seconds']}s CPU.")
+    close_client(driver)
+    clear_cache(driver)
+    driver.quit()
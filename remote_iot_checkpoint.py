@@ -0,0 +1,75 @@
+# Append-only journal of submitted execution batches, used to resume an interrupted run
+import logging
+from contextlib import closing
+from datetime import datetime
+
+from remote_iot_store import connect
+
+JOURNAL_TABLE = "batch_journal"
+
+SUBMITTED = "submitted"
+# The submit click went through but the portal never confirmed the job; treated as submitted
+UNCONFIRMED = "submitted, unconfirmed"
+FAILED = "failed"
+
+# Run ids of retry-queue runs start with this, so resuming never picks one
+RETRY_PREFIX = "retry_"
+
+
+def ensure_schema(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {JOURNAL_TABLE} (
+            run_id TEXT NOT NULL,
+            batch_number INTEGER,
+            device_name TEXT NOT NULL,
+            status TEXT NOT NULL,
+            recorded_at TEXT NOT NULL,
+            error TEXT
+        )""")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_journal_run ON {JOURNAL_TABLE} (run_id, status)")
+
+
+def start_run(path, resume=False, retry=False):
+    """Returns the run id to journal under: the most recent full run when resuming, otherwise a new one.
+
+    With `retry` the new run is tagged as a retry-queue run, which resuming skips.
+    """
+    with closing(connect(path)) as conn, conn:
+        ensure_schema(conn)
+        if resume:
+            latest = conn.execute(f"""
+                SELECT run_id FROM {JOURNAL_TABLE} WHERE substr(run_id, 1, ?) != ?
+                ORDER BY rowid DESC LIMIT 1""", (len(RETRY_PREFIX), RETRY_PREFIX)).fetchone()
+            if latest:
+                logging.info(f"Resuming execution run {latest[0]}.")
+                return latest[0]
+            logging.info("No earlier execution run to resume, starting a new one.")
+    run_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    return RETRY_PREFIX + run_id if retry else run_id
+
+
+def record_batch(path, run_id, batch_number, devices, status, error=None):
+    """Appends one journal row per device of a batch; each call commits on its own."""
+    now = datetime.now().isoformat(timespec="seconds")
+    with closing(connect(path)) as conn, conn:
+        ensure_schema(conn)
+        conn.executemany(f"INSERT INTO {JOURNAL_TABLE} VALUES (?, ?, ?, ?, ?, ?)",
+                         [(run_id, batch_number, device, status, now, error) for device in devices])
+
+
+def done_devices(path, run_id):
+    """Returns the devices already submitted in run `run_id`, unconfirmed ones included, in submission order."""
+    with closing(connect(path)) as conn:
+        ensure_schema(conn)
+        rows = conn.execute(f"""
+            SELECT device_name FROM {JOURNAL_TABLE} WHERE run_id = ? AND status IN (?, ?)
+            GROUP BY device_name ORDER BY MIN(rowid)""", (run_id, SUBMITTED, UNCONFIRMED)).fetchall()
+    return [device for (device,) in rows]
+
+
+def last_batch_number(path, run_id):
+    """Returns the highest batch number journaled for run `run_id`, 0 when it has none."""
+    with closing(connect(path)) as conn:
+        ensure_schema(conn)
+        (number,) = conn.execute(f"SELECT MAX(batch_number) FROM {JOURNAL_TABLE} WHERE run_id = ?", (run_id,)).fetchone()
+    return number or 0
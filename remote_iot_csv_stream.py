@@ -0,0 +1,42 @@
+# Chunked, column-pruned reading of large portal CSV exports
+import logging
+
+import pandas as pd
+
+CHUNK_SIZE = 50_000
+
+
+def _rewind(source):
+    # In-memory exports (remote_iot_export_capture) are read more than once
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+# Compact dtypes for the low-cardinality columns of the exports; columns absent from a file are ignored
+DEVICE_DTYPES = {"Status": "category"}
+JOBS_DTYPES = {"Status": "category", "Job Name": "category"}
+
+
+def csv_columns(path):
+    """Returns the header of a CSV export (a path or an in-memory buffer) without reading its rows."""
+    _rewind(path)
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def read_csv_chunks(path, columns=None, dtype=None, where=None, chunksize=CHUNK_SIZE):
+    """Yields the rows of a CSV export chunk by chunk.
+
+    Only `columns` are parsed (all when None) and `where`, a function from a
+    chunk to a boolean mask, drops rows before the next chunk is read. Every
+    chunk is yielded, even when nothing matched, so callers always see the
+    columns of the export.
+    """
+    usecols = (lambda column: column in columns) if columns else None
+    total = kept = 0
+    _rewind(path)
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunksize):
+        total += len(chunk)
+        if where is not None:
+            chunk = chunk[where(chunk)]
+        kept += len(chunk)
+        yield chunk
+    logging.debug(f"Read {total} rows from {path}, kept {kept}.")
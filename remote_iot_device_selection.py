@@ -0,0 +1,116 @@
+# Selecting the target devices of a batch job in the portal's two-list device picker
+import logging
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support import expected_conditions as EC
+from remote_iot_selectors import lookup
+from remote_iot_waits import run_step, click, fill_text, wait_for_element, network_idle
+
+# Longest quoted, pipe-joined search text sent in one query; override with portal.max_search_length
+MAX_QUERY_LENGTH = 500
+
+AVAILABLE = "job_dialog.available_devices"
+SELECTED = "job_dialog.selected_devices"
+
+OPTION_TEXTS_SCRIPT = "return Array.prototype.map.call(arguments[0].options, function (o) { return o.text.trim(); });"
+
+# Selects exactly the options whose text is in arguments[1] and returns how many were selected
+SELECT_OPTIONS_SCRIPT = """
+    var select = arguments[0], wanted = {}, count = 0;
+    arguments[1].forEach(function (name) { wanted[name] = true; });
+    Array.prototype.forEach.call(select.options, function (o) {
+        o.selected = wanted.hasOwnProperty(o.text.trim());
+        if (o.selected) { count++; }
+    });
+    select.dispatchEvent(new Event('change', {bubbles: true}));
+    return count;
+"""
+
+
+class DeviceSelectionError(Exception):
+    """Devices that were not requested ended up in the job, or none of the requested ones could be selected."""
+
+    def __init__(self, missing, unexpected):
+        self.missing = sorted(missing)
+        self.unexpected = sorted(unexpected)
+        super().__init__(f"Device selection mismatch: {len(self.missing)} missing {self.missing[:10]}, "
+                         f"{len(self.unexpected)} unexpected {self.unexpected[:10]}")
+
+
+def search_text(devices):
+    return f'"{"|".join(devices)}"'
+
+
+def query_chunks(devices, max_length=MAX_QUERY_LENGTH):
+    """Splits `devices` into groups whose search text is at most `max_length` characters (one device always fits)."""
+    chunks, current = [], []
+    for device in devices:
+        if current and len(search_text(current + [device])) > max_length:
+            chunks.append(current)
+            current = []
+        current.append(device)
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def option_texts(driver, target):
+    select = lookup(driver, target)
+    return driver.execute_script(OPTION_TEXTS_SCRIPT, select) if select else []
+
+
+def lists_any_of(target, names):
+    """Condition that holds once the <select> at `target` lists at least one of `names`."""
+    wanted = set(names)
+
+    def condition(driver):
+        return bool(wanted.intersection(option_texts(driver, target)))
+    return condition
+
+
+def lists_all_of(target, names):
+    """Condition that holds once the <select> at `target` lists every one of `names`."""
+    wanted = set(names)
+
+    def condition(driver):
+        return wanted.issubset(option_texts(driver, target))
+    return condition
+
+
+def select_devices(driver, devices, max_query_length=MAX_QUERY_LENGTH, timeout=10):
+    """Moves `devices` into the job's selected list and returns the ones that got selected, in request order.
+
+    Long lists are searched in chunks that stay under the portal's query
+    length. Search text is set through JavaScript rather than typed, and only
+    options that exactly match a requested name are selected, so a partial
+    regex match never ends up in the job. Devices the portal does not list
+    are logged and left out, so the caller can submit the rest. Raises
+    DeviceSelectionError when a device that was not requested got selected
+    or when none of the requested devices could be selected.
+    """
+    requested = list(dict.fromkeys(devices))
+    chunks = query_chunks(requested, max_query_length)
+    for number, chunk in enumerate(chunks, start=1):
+        fill_text(driver, "device search text", "job_dialog.device_search", search_text(chunk))
+        try:
+            click(driver, "device search", "job_dialog.device_search_button",
+                  until=EC.all_of(network_idle(), lists_any_of(AVAILABLE, chunk)), timeout=timeout)
+        except TimeoutException:
+            logging.warning(f"Device search {number}/{len(chunks)} found none of its {len(chunk)} devices.")
+            continue
+
+        select = wait_for_element(driver, AVAILABLE)
+        found = run_step(driver, "select devices", lambda: driver.execute_script(SELECT_OPTIONS_SCRIPT, select, chunk))
+        if found:
+            matched = set(chunk).intersection(option_texts(driver, AVAILABLE))
+            click(driver, "add devices", "job_dialog.add_devices", until=lists_all_of(SELECTED, matched), timeout=timeout)
+        logging.debug(f"Device search {number}/{len(chunks)}: {found} of {len(chunk)} devices selected.")
+
+    selected = set(option_texts(driver, SELECTED))
+    wanted = set(requested)
+    missing = wanted - selected
+    if selected - wanted or not selected:
+        raise DeviceSelectionError(missing, selected - wanted)
+    for device in sorted(missing):
+        logging.warning(f"Device {device} could not be selected for the job, leaving it out.", extra={"device": device})
+    logging.info(f"Selected {len(selected)} of {len(requested)} devices in {len(chunks)} searches.")
+    return [device for device in requested if device in selected]
@@ -0,0 +1,137 @@
+# Incremental sync of the device export into a persisted device table with status history
+import json
+import logging
+from contextlib import closing
+from datetime import datetime
+
+import pandas as pd
+
+from remote_iot_store import connect
+from remote_iot_profiling import timed
+
+DEVICES_TABLE = "devices"
+TRANSITIONS_TABLE = "device_transitions"
+
+# Status recorded for devices that are no longer in the export
+REMOVED = "removed"
+
+
+def ensure_schema(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DEVICES_TABLE} (
+            device_name TEXT PRIMARY KEY,
+            status TEXT,
+            row_hash TEXT NOT NULL,
+            row_json TEXT NOT NULL,
+            first_seen TEXT NOT NULL,
+            last_seen TEXT NOT NULL,
+            last_changed TEXT NOT NULL
+        )""")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TRANSITIONS_TABLE} (
+            device_name TEXT NOT NULL,
+            old_status TEXT,
+            new_status TEXT,
+            changed_at TEXT NOT NULL
+        )""")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_transitions_device ON {TRANSITIONS_TABLE} (device_name, changed_at)")
+
+
+def sync_timestamp():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+@timed()
+def sync_devices(path, export_df, key="Device Name", synced_at=None):
+    """Applies only the new or changed rows of `export_df` to the device table.
+
+    Each export row is hashed and compared with the stored hash for its device.
+    Status changes (including first sightings) are recorded in the transitions
+    table. Every device in `export_df` gets `synced_at` as its last_seen, so
+    chunks of one export share a timestamp. Returns the changed rows of
+    `export_df`.
+    """
+    export_df = export_df.dropna(subset=[key]).drop_duplicates(subset=[key], keep="last")
+    row_hashes = pd.util.hash_pandas_object(export_df, index=False).astype(str)
+    now = synced_at or sync_timestamp()
+
+    with closing(connect(path)) as conn, conn:
+        ensure_schema(conn)
+        stored = dict(conn.execute(f"SELECT device_name, row_hash FROM {DEVICES_TABLE}").fetchall())
+        stored_status = dict(conn.execute(f"SELECT device_name, status FROM {DEVICES_TABLE}").fetchall())
+
+        changed_mask = [stored.get(name) != row_hash for name, row_hash in zip(export_df[key], row_hashes)]
+        changed_df = export_df[changed_mask]
+        changed_hashes = row_hashes[changed_mask]
+
+        upserts = []
+        transitions = []
+        has_status = "Status" in changed_df.columns
+        for (_, row), row_hash in zip(changed_df.iterrows(), changed_hashes):
+            name = row[key]
+            status = row["Status"] if has_status and pd.notna(row["Status"]) else None
+            upserts.append((name, status, row_hash, json.dumps(row.to_dict(), default=str), now, now, now))
+            if name not in stored or stored_status.get(name) != status:
+                transitions.append((name, stored_status.get(name), status, now))
+
+        conn.executemany(f"""
+            INSERT INTO {DEVICES_TABLE} (device_name, status, row_hash, row_json, first_seen, last_seen, last_changed)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(device_name) DO UPDATE SET
+                status = excluded.status, row_hash = excluded.row_hash, row_json = excluded.row_json,
+                last_seen = excluded.last_seen, last_changed = excluded.last_changed""", upserts)
+        conn.executemany(f"INSERT INTO {TRANSITIONS_TABLE} VALUES (?, ?, ?, ?)", transitions)
+
+        unchanged = [name for name, is_changed in zip(export_df[key], changed_mask) if not is_changed]
+        conn.executemany(f"UPDATE {DEVICES_TABLE} SET last_seen = ? WHERE device_name = ?",
+                         [(now, name) for name in unchanged])
+
+    logging.info(f"Device sync: {len(export_df)} rows, {len(changed_df)} changed, {len(transitions)} status transitions.")
+    return changed_df
+
+
+def mark_removed(path, synced_at):
+    """Records a removed transition for every device not seen in the sync at `synced_at`.
+
+    The stored row hash is cleared, so a device that comes back is treated
+    as changed and gets a transition out of removed. Nothing is marked when
+    the sync saw no devices at all, as that is an empty or failed export.
+    Returns the number of devices marked.
+    """
+    with closing(connect(path)) as conn, conn:
+        ensure_schema(conn)
+        if not conn.execute(f"SELECT 1 FROM {DEVICES_TABLE} WHERE last_seen = ? LIMIT 1", (synced_at,)).fetchone():
+            logging.warning("Device sync saw no devices, not marking any as removed.")
+            return 0
+        gone = conn.execute(f"""
+            SELECT device_name, status FROM {DEVICES_TABLE}
+            WHERE last_seen < ? AND status IS NOT ?""", (synced_at, REMOVED)).fetchall()
+        conn.executemany(f"INSERT INTO {TRANSITIONS_TABLE} VALUES (?, ?, ?, ?)",
+                         [(name, status, REMOVED, synced_at) for name, status in gone])
+        conn.executemany(f"UPDATE {DEVICES_TABLE} SET status = ?, row_hash = '', last_changed = ? WHERE device_name = ?",
+                         [(REMOVED, synced_at, name) for name, _ in gone])
+    if gone:
+        logging.info(f"Device sync: {len(gone)} devices no longer in the export, marked as removed.")
+    return len(gone)
+
+
+def sync_export(path, chunks, key="Device Name"):
+    """Syncs every chunk of one export, then marks the devices it no longer lists as removed.
+
+    Returns the changed rows of all chunks.
+    """
+    synced_at = sync_timestamp()
+    changed_df = pd.concat([sync_devices(path, chunk, key, synced_at) for chunk in chunks], ignore_index=True)
+    mark_removed(path, synced_at)
+    return changed_df
+
+
+def read_devices(path):
+    """Returns the devices seen in the latest sync, rebuilt from the stored export rows."""
+    with closing(connect(path)) as conn:
+        ensure_schema(conn)
+        rows = conn.execute(f"""
+            SELECT row_json FROM {DEVICES_TABLE}
+            WHERE last_seen = (SELECT MAX(last_seen) FROM {DEVICES_TABLE})""").fetchall()
+    return pd.DataFrame([json.loads(row_json) for (row_json,) in rows])
+
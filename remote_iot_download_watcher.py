@@ -0,0 +1,190 @@
+# Shared download watcher used by the fetch and command-status scripts
+import os
+import time
+import fnmatch
+import logging
+import threading
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # watchdog is optional, fall back to the mtime index
+    Observer = None
+    FileSystemEventHandler = object
+
+# Suffixes Chrome / Firefox use while a download is still in progress
+PARTIAL_SUFFIXES = (".crdownload", ".part", ".tmp")
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher._notify(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher._notify(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher._notify(event.dest_path)
+
+
+class DownloadWatcher:
+    """Waits for a new file matching `pattern` to finish downloading into `download_dir`.
+
+    Call start() before triggering the download so files that already exist
+    in the folder are ignored, then wait() for the completed file path.
+    Uses filesystem events when watchdog is installed, otherwise an
+    incremental index that only rescans the folder when its mtime changes.
+    """
+
+    def __init__(self, download_dir, pattern, poll_interval=0.5, stable_checks=2):
+        self.download_dir = download_dir
+        self.pattern = pattern.lower()
+        self.poll_interval = poll_interval
+        self.stable_checks = stable_checks
+        self._index = {}
+        self._dir_mtime = None
+        self._candidates = {}
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._observer = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        self._dir_mtime = self._read_dir_mtime()
+        self._index = self._scan()
+        logging.debug(f"Download watcher indexed {len(self._index)} existing files in {self.download_dir}")
+
+        if Observer is not None:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_EventHandler(self), self.download_dir, recursive=False)
+                self._observer.start()
+                logging.debug("Download watcher using filesystem events.")
+            except Exception as e:
+                logging.warning(f"Filesystem events unavailable, polling instead: {e}")
+                self._observer = None
+        if self._observer is None:
+            # An export overwriting an existing file in place keeps its name and may leave the folder's
+            # mtime unchanged, so existing matches are watched too; their stat is compared with the index
+            with self._lock:
+                for name in self._index:
+                    if self._matches(name):
+                        self._candidates.setdefault(name, (None, 0))
+        return self
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
+
+    def poll(self):
+        """Returns the path of a matching file that is fully written by now, or None; does not block."""
+        if self._observer is None:
+            self._poll_directory()
+        return self._check_candidates()
+
+    def wait(self, timeout=60):
+        """Returns the path of the first matching file that is fully written, or None on timeout."""
+        end_time = time.time() + timeout
+        while time.time() < end_time:
+            completed = self.poll()
+            if completed:
+                logging.info(f"Download completed: {completed}")
+                return completed
+
+            self._event.wait(self.poll_interval)
+            self._event.clear()
+
+        logging.error(f"Timeout: no '{self.pattern}' download completed in {self.download_dir} within {timeout}s.")
+        return None
+
+    def _matches(self, name):
+        lowered = name.lower()
+        return not lowered.endswith(PARTIAL_SUFFIXES) and fnmatch.fnmatch(lowered, self.pattern)
+
+    def _notify(self, path):
+        name = os.path.basename(path)
+        if self._matches(name):
+            with self._lock:
+                self._candidates.setdefault(name, (None, 0))
+            self._event.set()
+
+    def _read_dir_mtime(self):
+        try:
+            return os.stat(self.download_dir).st_mtime_ns
+        except OSError:
+            return None
+
+    def _scan(self):
+        index = {}
+        try:
+            with os.scandir(self.download_dir) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        index[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except OSError as e:
+            logging.debug(f"Could not scan download folder: {e}")
+        return index
+
+    def _poll_directory(self):
+        # Entries are only re-read when the folder itself changed (file created, renamed or removed)
+        dir_mtime = self._read_dir_mtime()
+        if dir_mtime == self._dir_mtime:
+            return
+        self._dir_mtime = dir_mtime
+
+        try:
+            with os.scandir(self.download_dir) as entries:
+                names = [entry.name for entry in entries]
+        except OSError as e:
+            logging.debug(f"Could not scan download folder: {e}")
+            return
+
+        # Known names count too: a download renamed over an existing file reuses its name
+        for name in names:
+            if self._matches(name):
+                with self._lock:
+                    self._candidates.setdefault(name, (None, 0))
+
+    def _check_candidates(self):
+        with self._lock:
+            candidates = list(self._candidates.items())
+
+        for name, (last_size, stable_count) in candidates:
+            path = os.path.join(self.download_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                with self._lock:
+                    self._candidates.pop(name, None)
+                continue
+
+            if name in self._index and self._index[name] == (stat.st_mtime_ns, stat.st_size):
+                continue
+
+            stable_count = stable_count + 1 if stat.st_size == last_size and stat.st_size > 0 else 0
+            with self._lock:
+                self._candidates[name] = (stat.st_size, stable_count)
+
+            if stable_count >= self.stable_checks - 1:
+                try:
+                    with open(path, "rb") as f:
+                        f.read(10)
+                    return path
+                except OSError as e:
+                    logging.debug(f"File not ready yet: {e}")
+        return None
@@ -0,0 +1,152 @@
+# Captures portal CSV exports from the browser's network traffic instead of the Downloads folder
+import io
+import os
+import json
+import time
+import base64
+import shutil
+import logging
+import tempfile
+
+from remote_iot_download_watcher import DownloadWatcher
+
+# MIME types and file suffix the portal's CSV exports are served with
+CSV_MIME_TYPES = ("text/csv", "application/csv", "text/comma-separated-values", "application/vnd.ms-excel")
+
+PERFORMANCE_LOG_CAPABILITY = "goog:loggingPrefs"
+
+
+def capture_enabled(browser_config):
+    """True when browser.capture_exports is set in config.json."""
+    return bool((browser_config or {}).get("capture_exports", False))
+
+
+def enable_network_log(options):
+    """Turns on Chrome's performance log, which carries the DevTools Network events read by ExportCapture."""
+    options.set_capability(PERFORMANCE_LOG_CAPABILITY, {"performance": "ALL"})
+
+
+class CapturedExport(io.BytesIO):
+    """An export held in memory; pandas reads it like a file."""
+
+    def __init__(self, content, url):
+        super().__init__(content)
+        self.url = url
+
+    def __str__(self):
+        return f"<in-memory export from {self.url}>"
+
+
+def _is_csv(response):
+    headers = {key.lower(): value for key, value in response.get("headers", {}).items()}
+    return (response.get("mimeType", "").lower() in CSV_MIME_TYPES
+            or ".csv" in headers.get("content-disposition", "").lower()
+            or response.get("url", "").split("?")[0].lower().endswith(".csv"))
+
+
+class ExportCapture:
+    """Takes the body of the next CSV response straight from the browser via the DevTools protocol.
+
+    Start it before triggering the export, then call wait(). Needs a driver
+    created with capture_exports enabled (see enable_network_log). While it
+    runs, Chrome's copy of the download goes to a private temporary folder
+    that stop() removes, so a captured export leaves nothing on disk. When
+    the body cannot be read, the downloaded file is moved to `download_dir`
+    and its path returned instead.
+    """
+
+    def __init__(self, driver, download_dir, pattern, poll_interval=0.2):
+        self.driver = driver
+        self.download_dir = download_dir
+        self.pattern = pattern
+        self.poll_interval = poll_interval
+        self._responses = {}
+        self._temp_dir = None
+        self._watcher = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        self.driver.execute_cdp_cmd("Network.enable", {})
+        # Drop events from before the export was triggered
+        self.driver.get_log("performance")
+
+        self._temp_dir = tempfile.mkdtemp(prefix="remote_iot_capture_")
+        try:
+            self.driver.execute_cdp_cmd("Browser.setDownloadBehavior",
+                                        {"behavior": "allow", "downloadPath": self._temp_dir})
+            watch_dir = self._temp_dir
+        except Exception as e:
+            logging.warning(f"Could not redirect browser downloads, the export is also saved to "
+                            f"{self.download_dir}: {e}")
+            watch_dir = self.download_dir
+        self._watcher = DownloadWatcher(watch_dir, self.pattern).start()
+        return self
+
+    def stop(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+        if self._temp_dir is not None:
+            try:
+                self.driver.execute_cdp_cmd("Browser.setDownloadBehavior", {"behavior": "default"})
+            except Exception as e:
+                logging.debug(f"Could not restore the browser's download behavior: {e}")
+            shutil.rmtree(self._temp_dir, ignore_errors=True)
+            self._temp_dir = None
+
+    def wait(self, timeout=60):
+        """Returns the export as a CapturedExport or, when its body is unavailable, as a downloaded file path.
+
+        The network log and the download folder are checked in the same loop,
+        so whichever delivers the export first ends the wait. Returns None
+        when neither did within `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for entry in self.driver.get_log("performance"):
+                message = json.loads(entry["message"])["message"]
+                params = message.get("params", {})
+                request_id = params.get("requestId")
+
+                if message["method"] == "Network.responseReceived" and _is_csv(params["response"]):
+                    self._responses[request_id] = params["response"]["url"]
+                elif message["method"] == "Network.loadingFinished" and request_id in self._responses:
+                    captured = self._read_body(request_id)
+                    if captured:
+                        return captured
+                elif message["method"] == "Network.loadingFailed" and request_id in self._responses:
+                    # A response handed over to the download manager ends this way too
+                    logging.debug(f"Export request ended in the browser: {params.get('errorText')}")
+
+            downloaded = self._watcher.poll()
+            if downloaded:
+                return self._keep_download(downloaded)
+            time.sleep(self.poll_interval)
+        logging.warning(f"No CSV export captured or downloaded within {timeout}s.")
+        return None
+
+    def _keep_download(self, path):
+        if os.path.dirname(path) == self.download_dir:
+            logging.info(f"Download completed: {path}")
+            return path
+        os.makedirs(self.download_dir, exist_ok=True)
+        target = shutil.move(path, os.path.join(self.download_dir, os.path.basename(path)))
+        logging.info(f"Export body unavailable in the browser, using the download: {target}")
+        return target
+
+    def _read_body(self, request_id):
+        url = self._responses[request_id]
+        try:
+            body = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+        except Exception as e:
+            # Chrome does not keep bodies of every download response
+            logging.warning(f"Could not read the export body from the browser: {e}")
+            return None
+        content = base64.b64decode(body["body"]) if body.get("base64Encoded") else body["body"].encode("utf-8")
+        logging.info(f"Captured {len(content)} bytes of export from {url} in memory.")
+        return CapturedExport(content, url)
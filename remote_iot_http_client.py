@@ -0,0 +1,125 @@
+# Direct HTTP transport for the RemoteIoT portal, reusing the browser's authenticated session
+import io
+import os
+import logging
+from datetime import datetime
+from urllib.parse import urljoin
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_BASE_URL = "https://remoteiot.com/portal/"
+
+# Paths are relative to base_url and can be overridden under portal.endpoints in config.json
+DEFAULT_ENDPOINTS = {
+    "login": "api/login",
+    "devices_export": "api/devices/export",
+    "batch_jobs": "api/jobs",
+    "jobs_export": "api/jobs/export",
+}
+
+_clients = {}
+
+
+def login_url(portal_config):
+    """Returns the portal login page for the configured base_url."""
+    base_url = portal_config.get("base_url", DEFAULT_BASE_URL)
+    return urljoin(base_url if base_url.endswith("/") else base_url + "/", "?link=login")
+
+
+def uses_http(portal_config, operation):
+    """True when config.json selects the HTTP transport for `operation` (default is the browser)."""
+    return portal_config.get("transport", {}).get(operation, "browser") == "http"
+
+
+def client_from_driver(driver, portal_config):
+    """Returns a pooled HTTP client carrying the cookies of the logged-in `driver`, one per browser session."""
+    client = _clients.get(driver.session_id)
+    if client is None:
+        client = PortalHttpClient(portal_config.get("base_url", DEFAULT_BASE_URL),
+                                  endpoints=portal_config.get("endpoints"),
+                                  pool_size=portal_config.get("pool_size", 10),
+                                  timeout=portal_config.get("timeout", 30))
+        client.load_cookies(driver.get_cookies())
+        _clients[driver.session_id] = client
+    return client
+
+
+def close_client(driver):
+    """Closes and forgets the HTTP client of `driver`'s browser session, if it has one."""
+    client = _clients.pop(driver.session_id, None)
+    if client is not None:
+        client.close()
+
+
+class PortalHttpClient:
+    """Performs portal operations over a keep-alive requests session instead of a rendered browser."""
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, endpoints=None, pool_size=10, timeout=30):
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.endpoints = {**DEFAULT_ENDPOINTS, **(endpoints or {})}
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                        allowed_methods=frozenset(["GET"]))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def url(self, endpoint):
+        return urljoin(self.base_url, self.endpoints[endpoint])
+
+    def load_cookies(self, cookies):
+        """Copies Selenium cookies (driver.get_cookies()) into the HTTP session."""
+        for cookie in cookies:
+            self.session.cookies.set(cookie["name"], cookie["value"],
+                                     domain=cookie.get("domain"), path=cookie.get("path", "/"))
+        logging.debug(f"Loaded {len(cookies)} browser cookies into the HTTP session.")
+
+    def login(self, username, password):
+        response = self.session.post(self.url("login"), data={"username": username, "password": password},
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        logging.info("Logged in over HTTP.")
+        return True
+
+    def _get_csv(self, endpoint):
+        response = self.session.get(self.url(endpoint), timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+    def export_devices(self):
+        """Returns the device list export as a DataFrame."""
+        return pd.read_csv(io.BytesIO(self._get_csv("devices_export")))
+
+    def export_jobs(self):
+        """Returns the jobs table export as a DataFrame."""
+        return pd.read_csv(io.BytesIO(self._get_csv("jobs_export")))
+
+    def save_export(self, endpoint, download_dir, prefix):
+        """Writes an export to `download_dir` under the same name pattern as the browser download."""
+        content = self._get_csv(endpoint)
+        os.makedirs(download_dir, exist_ok=True)
+        path = os.path.join(download_dir, datetime.now().strftime(f"{prefix}_%Y%m%d_%H%M%S_%f.csv"))
+        with open(path, "wb") as f:
+            f.write(content)
+        logging.info(f"Saved {endpoint} export to {path}")
+        return path
+
+    def create_batch_job(self, job_name, device_list, script=None, command=None):
+        """Creates a batch job that runs `script` (a stored script name) or `command` on the given devices."""
+        payload = {"name": job_name, "devices": list(device_list)}
+        if script:
+            payload["script"] = script
+        if command:
+            payload["command"] = command
+        response = self.session.post(self.url("batch_jobs"), json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        logging.info(f"Created batch job '{job_name}' for {len(payload['devices'])} devices over HTTP.")
+        return response.json() if response.content else {}
+
+    def close(self):
+        self.session.close()
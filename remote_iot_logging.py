@@ -0,0 +1,197 @@
+# Shared, non-blocking logging: callers only enqueue records, a listener thread formats and writes them
+import os
+import glob
+import gzip
+import json
+import time
+import queue
+import atexit
+import shutil
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+CONSOLE_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Child scripts started by main.py inherit the run id through the environment
+RUN_ID_ENV = "REMOTE_IOT_RUN_ID"
+
+DEFAULTS = {
+    "level": "DEBUG",
+    "log_dir": "logs",
+    "file_name": "remote_iot.jsonl",
+    "max_bytes": 10 * 1024 * 1024,
+    "max_age_hours": 24,
+    "backup_count": 20,
+    "keep_days": 14,
+}
+
+CONTEXT_FIELDS = ("run", "stage", "batch", "device")
+
+_lock = threading.Lock()
+_listener = None
+# run and stage apply to every thread of the process, batch and device only to the current thread or task
+_process_context = {"run": None, "stage": None}
+_local_context = contextvars.ContextVar("remote_iot_log_context", default={})
+
+
+def new_run_id():
+    return os.environ.get(RUN_ID_ENV) or datetime.now().strftime(f"%Y%m%d_%H%M%S_{os.getpid()}")
+
+
+def current_run():
+    return _process_context["run"]
+
+
+def set_context(**fields):
+    """Sets process-wide fields (run, stage) attached to every following record."""
+    _process_context.update(fields)
+
+
+@contextmanager
+def log_context(**fields):
+    """Attaches fields such as batch or device to the records logged inside the block by this thread."""
+    token = _local_context.set({**_local_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _local_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Stamps run, stage, batch and device onto records in the logging thread, before they are queued."""
+
+    def filter(self, record):
+        context = {**_process_context, **_local_context.get()}
+        for name in CONTEXT_FIELDS:
+            if getattr(record, name, None) is None:
+                setattr(record, name, context.get(name))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields that are not set are left out."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for name in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        return json.dumps(entry, default=str)
+
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """Rotates when the file exceeds `max_bytes` or was started more than `max_age` seconds ago.
+
+    Rotated files are gzipped, and any older than `keep_days` are deleted.
+    """
+
+    def __init__(self, filename, max_bytes, backup_count, max_age, keep_days):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.max_age = max_age
+        self.keep_days = keep_days
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._compress
+        self._started = self._first_record_time()
+
+    def _first_record_time(self):
+        try:
+            with open(self.baseFilename, encoding="utf-8") as f:
+                first = json.loads(f.readline())
+            return datetime.fromisoformat(first["time"]).timestamp()
+        except (OSError, ValueError, KeyError):
+            return time.time()
+
+    @staticmethod
+    def _compress(source, destination):
+        with open(source, "rb") as f_in, gzip.open(destination, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return True
+        return bool(self.max_age) and self.stream is not None and self.stream.tell() > 0 \
+            and time.time() - self._started >= self.max_age
+
+    def doRollover(self):
+        super().doRollover()
+        self._started = time.time()
+        self.prune()
+
+    def prune(self):
+        if not self.keep_days:
+            return
+        cutoff = time.time() - self.keep_days * 86400
+        for path in glob.glob(self.baseFilename + ".*.gz"):
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+
+
+def _read_logging_config(config_path):
+    try:
+        with open(config_path, "r") as config_file:
+            return json.load(config_file).get("logging", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def setup_logging(stage=None, logging_config=None, config_path="config.json"):
+    """Routes the root logger through a queue to a console handler and a rotating JSON-lines file.
+
+    Safe to call from every script: the first call installs the handlers and
+    later calls only update the stage. `logging_config` defaults to the
+    "logging" section of config.json.
+    """
+    global _listener
+    with _lock:
+        if stage:
+            set_context(stage=stage)
+        if _listener is not None:
+            return
+        settings = {**DEFAULTS, **(logging_config if logging_config is not None else _read_logging_config(config_path))}
+        set_context(run=new_run_id())
+
+        log_dir = os.path.expanduser(settings["log_dir"])
+        os.makedirs(log_dir, exist_ok=True)
+        file_handler = CompressingRotatingFileHandler(os.path.join(log_dir, settings["file_name"]),
+                                                      max_bytes=settings["max_bytes"],
+                                                      backup_count=settings["backup_count"],
+                                                      max_age=settings["max_age_hours"] * 3600,
+                                                      keep_days=settings["keep_days"])
+        file_handler.setFormatter(JsonFormatter())
+        file_handler.prune()
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(settings["level"])
+
+        _listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+    logging.info(f"Logging initialized. Log file: {file_handler.baseFilename}")
+
+
+def stop_logging():
+    """Flushes the queue and stops the listener thread; runs automatically at exit."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
@@ -0,0 +1,176 @@
+# Asyncio orchestrator running the fetch -> execute -> verify stages in one process
+import os
+import asyncio
+import logging
+
+import remote_iot_sub_automation_fetch_devices_status as fetch_stage
+import remote_iot_sub_automation_Script_execution as execution_stage
+import remote_iot_sub_automation_command_status as status_stage
+from remote_iot_browser import create_driver, quit_driver
+from remote_iot_stage_results import FetchResult, ExecutionResult, VerificationResult
+from remote_iot_stage_cache import STAGES, forced_stages, cached_stage, fingerprint, record_stage
+from remote_iot_store import store_path, read_table, EXECUTED_TABLE
+from remote_iot_retry_queue import due_devices, queued_devices, DEAD
+from remote_iot_logging import set_context
+from remote_iot_profiling import start_trace, log_summary, span
+
+
+async def run_fetch(driver):
+    """Downloads the device export and returns it with its parse running as a task, so later work can overlap."""
+    set_context(stage="fetch")
+    config = fetch_stage.config["script_1"]
+    download_path = os.path.expanduser(config["download_path"])
+
+    export_path = await asyncio.to_thread(fetch_stage.download_device_list, driver, download_path)
+    if not export_path:
+        return None, None
+    return export_path, asyncio.create_task(asyncio.to_thread(fetch_stage.filter_offline_devices, export_path, config["save_path"]))
+
+
+def cached_results(config, forced, stages=STAGES):
+    """Returns the reusable results of `stages`, in order, up to the first stage that has to run."""
+    results = {}
+    for stage in stages:
+        artifact = cached_stage(config, stage, forced)
+        if artifact is None:
+            break
+        if stage == "fetch":
+            results[stage] = FetchResult(tracking_path=artifact["tracking_path"])
+        elif stage == "execute":
+            executed = read_table(store_path(config), EXECUTED_TABLE)
+            results[stage] = ExecutionResult(executed_devices=executed["Executed Devices"].tolist(),
+                                             batch_count=artifact["batch_count"])
+        else:
+            results[stage] = VerificationResult(jobs_file=artifact["jobs_file"], output_path=artifact["output_path"])
+    return results
+
+
+def quit_workers(worker_drivers):
+    for worker_driver in worker_drivers:
+        if worker_driver is not None:
+            quit_driver(worker_driver)
+
+
+async def start_extra_workers():
+    """Starts and logs in the additional worker-pool browsers configured for the execution stage."""
+    extra = max(0, execution_stage.config["script_2"].get("workers", 1) - 1)
+    if not extra:
+        return []
+    logging.info(f"Starting {extra} extra execution workers in the background.")
+    return list(await asyncio.gather(*(asyncio.to_thread(execution_stage.start_worker_driver) for _ in range(extra))))
+
+
+async def run_pipeline(resume=None, force=()):
+    """Runs all stages with one logged-in driver and returns the stage results.
+
+    Blocking Selenium and pandas calls run in worker threads, so independent
+    work overlaps: the device export is parsed while the extra execution
+    workers start up and log in. Stages hand off through typed results and
+    the pipeline stops at the first stage that produced nothing usable.
+    `resume` is passed on to the execution stage.
+
+    Stages whose inputs and settings have not changed since their last
+    successful run are skipped and their recorded output reused (see
+    remote_iot_stage_cache); stages named in `force` and everything
+    downstream of them always run. The browser is only started when at
+    least one stage has to run.
+    """
+    config = fetch_stage.config
+    forced = forced_stages(force)
+    start_trace(config.get("profiling", {}), "pipeline")
+    results = cached_results(config, forced)
+    if "verify" in results:
+        logging.info("Nothing changed since the last run, every stage's output was reused.")
+        return results
+
+    with span("start browser"):
+        driver = await asyncio.to_thread(create_driver, None, config.get("browser"))
+    try:
+        creds = fetch_stage.load_credentials()
+        if not await asyncio.to_thread(fetch_stage.login, driver, creds.get("username", ""), creds.get("password", "")):
+            logging.error("Login failed!")
+            return results
+
+        worker_drivers = None
+        if "fetch" not in results:
+            stage_fingerprint = fingerprint(config, "fetch")
+            export_path, parse_task = await run_fetch(driver)
+            if parse_task is None:
+                logging.error("Device list download failed!")
+                return results
+
+            workers_task = asyncio.create_task(start_extra_workers())
+            tracking_path = await parse_task
+            results["fetch"] = FetchResult(export_path=export_path, tracking_path=tracking_path)
+            worker_drivers = await workers_task
+            if tracking_path is None:
+                logging.error("No tracking list was produced, stopping before execution.")
+                quit_workers(worker_drivers)
+                return results
+
+            record_stage(config, "fetch", stage_fingerprint, tracking_path=tracking_path)
+            # A fresh tracking list may still be the one the later stages already processed
+            results.update(cached_results(config, forced, STAGES[1:]))
+            if "execute" in results:
+                quit_workers(worker_drivers)
+            if "verify" in results:
+                return results
+
+        if "execute" not in results:
+            # Reload the portal between stages so each one starts from the dashboard
+            await asyncio.to_thread(driver.refresh)
+            results["execute"] = await asyncio.to_thread(execution_stage.run_stage, driver, worker_drivers, resume)
+            if not results["execute"].ok:
+                logging.error("No devices were executed, skipping verification.")
+                return results
+            results.update(cached_results(config, forced, ("verify",)))
+
+        if "verify" not in results:
+            await asyncio.to_thread(driver.refresh)
+            results["verify"] = await asyncio.to_thread(status_stage.run_stage, driver)
+        if results["verify"].ok:
+            logging.info("All stages completed successfully.")
+        return results
+    finally:
+        await asyncio.to_thread(quit_driver, driver)
+        log_summary()
+
+
+async def run_retries():
+    """Re-drives only the devices due in the retry queue through execution and verification.
+
+    Verification updates the queue: verified devices leave it, the others get
+    another attempt after their backoff or end up on the dead-letter list.
+    """
+    config = fetch_stage.config
+    store = store_path(config)
+    results = {}
+    dead = queued_devices(store, DEAD)
+    if not dead.empty:
+        logging.warning(f"{len(dead)} devices are on the dead-letter list and are not retried.")
+    devices = due_devices(store)
+    if not devices:
+        logging.info("No devices are due for a retry.")
+        return results
+
+    start_trace(config.get("profiling", {}), "retry")
+    logging.info(f"Retrying {len(devices)} devices.")
+    with span("start browser"):
+        driver = await asyncio.to_thread(create_driver, None, config.get("browser"))
+    try:
+        creds = fetch_stage.load_credentials()
+        if not await asyncio.to_thread(fetch_stage.login, driver, creds.get("username", ""), creds.get("password", "")):
+            logging.error("Login failed!")
+            return results
+
+        results["execute"] = await asyncio.to_thread(execution_stage.run_stage, driver, None, False, devices)
+        if not results["execute"].ok:
+            logging.error("No retried devices were executed, skipping verification.")
+            return results
+
+        await asyncio.to_thread(driver.refresh)
+        results["verify"] = await asyncio.to_thread(status_stage.run_stage, driver, devices)
+        return results
+    finally:
+        await asyncio.to_thread(quit_driver, driver)
+        log_summary()
@@ -0,0 +1,143 @@
+# Per-step timing instrumentation and end-of-run profile report
+import os
+import json
+import time
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+from datetime import datetime
+
+_lock = threading.Lock()
+_trace_file = None
+_trace_path = None
+_run_start = time.perf_counter()
+
+# step name -> list of durations in seconds
+_durations = {}
+# step name -> retry count
+_retries = {}
+# step name -> failed span count
+_failures = {}
+
+
+def start_trace(profiling_config, run_name):
+    """Opens the JSON-lines trace for this run when profiling is enabled in config.json.
+
+    Every line is a Chrome trace "complete" event, so the file can also be
+    converted for chrome://tracing with export_chrome_trace().
+    """
+    global _trace_file, _trace_path
+    if not profiling_config.get("enabled", True) or _trace_file is not None:
+        return _trace_path
+
+    trace_dir = os.path.expanduser(profiling_config.get("trace_dir", "traces"))
+    os.makedirs(trace_dir, exist_ok=True)
+    _trace_path = os.path.join(trace_dir, datetime.now().strftime(f"%Y%m%d_%H%M%S_{run_name}.trace.jsonl"))
+    _trace_file = open(_trace_path, "a", encoding="utf-8")
+    logging.info(f"Writing step trace to {_trace_path}")
+    return _trace_path
+
+
+def record(name, duration, ok=True, **fields):
+    """Records one finished step of `duration` seconds, with any extra fields (batch, devices, ...)."""
+    with _lock:
+        _durations.setdefault(name, []).append(duration)
+        if not ok:
+            _failures[name] = _failures.get(name, 0) + 1
+
+        if _trace_file is not None:
+            end = time.perf_counter() - _run_start
+            event = {
+                "name": name,
+                "ph": "X",
+                "ts": round((end - duration) * 1e6),
+                "dur": round(duration * 1e6),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": {"ok": ok, **fields},
+            }
+            _trace_file.write(json.dumps(event, default=str) + "\n")
+            _trace_file.flush()
+
+
+def record_retry(name, count=1):
+    with _lock:
+        _retries[name] = _retries.get(name, 0) + count
+
+
+@contextmanager
+def span(name, **fields):
+    """Times the enclosed block as step `name`; exceptions are recorded as failures and re-raised."""
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield fields
+    except Exception:
+        ok = False
+        raise
+    finally:
+        record(name, time.perf_counter() - start, ok, **fields)
+
+
+def timed(name=None):
+    """Decorator that records every call of the function as a step (defaults to the function name)."""
+    def decorator(func):
+        step_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(step_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summary():
+    """Returns one dict per step with count, total, mean, p50, p95, max, retries and failures."""
+    with _lock:
+        rows = []
+        for name, durations in _durations.items():
+            rows.append({
+                "step": name,
+                "count": len(durations),
+                "total": sum(durations),
+                "mean": sum(durations) / len(durations),
+                "p50": _percentile(durations, 0.5),
+                "p95": _percentile(durations, 0.95),
+                "max": max(durations),
+                "retries": _retries.get(name, 0),
+                "failures": _failures.get(name, 0),
+            })
+    return sorted(rows, key=lambda row: row["total"], reverse=True)
+
+
+def log_summary():
+    """Logs the run profile as a table, slowest steps (by total time) first."""
+    rows = summary()
+    if not rows:
+        return
+    width = max(len(row["step"]) for row in rows)
+    logging.info(f"{'Step':<{width}}  {'Count':>5}  {'Total s':>8}  {'Mean s':>7}  {'p95 s':>7}  {'Max s':>7}  {'Retries':>7}  {'Failed':>6}")
+    for row in rows:
+        logging.info(f"{row['step']:<{width}}  {row['count']:>5}  {row['total']:>8.2f}  {row['mean']:>7.2f}  "
+                     f"{row['p95']:>7.2f}  {row['max']:>7.2f}  {row['retries']:>7}  {row['failures']:>6}")
+    logging.info(f"Run wall time: {time.perf_counter() - _run_start:.2f}s")
+    if _trace_path:
+        logging.info(f"Step trace: {_trace_path}")
+
+
+def export_chrome_trace(trace_path, output_path=None):
+    """Converts a JSON-lines trace into a JSON array loadable in chrome://tracing or Perfetto."""
+    output_path = output_path or trace_path.replace(".jsonl", ".json")
+    with open(trace_path, encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(events, f)
+    return output_path
@@ -0,0 +1,86 @@
+# Per-device reconciliation of the tracking list, the executed devices and the jobs export
+import logging
+
+import numpy as np
+import pandas as pd
+
+from remote_iot_versions import SUCCESSFUL
+
+VERIFIED = "verified"
+FAILED = "failed"
+EXECUTED = "executed"
+MISSING_FROM_EXPORT = "missing from export"
+NEVER_SUBMITTED = "never submitted"
+
+OUTCOMES = [VERIFIED, FAILED, EXECUTED, MISSING_FROM_EXPORT, NEVER_SUBMITTED]
+
+# Outcomes that settle a device; the others stay on the tracking list for the next run
+CONCLUSIVE_OUTCOMES = (VERIFIED, FAILED)
+
+
+def _device_index(devices):
+    names = pd.Series(devices, dtype="string").dropna().str.strip()
+    names = names[names != ""]
+    duplicates = names.duplicated()
+    if duplicates.any():
+        logging.warning(f"{int(duplicates.sum())} duplicate device names ignored.")
+    return pd.Index(names[~duplicates], name="Device Name")
+
+
+def latest_result_per_device(export_df, job_name=None):
+    """Keeps the rows of the `job_name` job (all rows when None) and of those the last one per device."""
+    if job_name is not None and "Job Name" in export_df.columns:
+        export_df = export_df[(export_df["Job Name"].astype("string").str.strip() == job_name).fillna(False)]
+    latest = export_df.dropna(subset=["Device Name"]).drop_duplicates("Device Name", keep="last")
+    return latest.set_index("Device Name")
+
+
+def reconcile(tracking_devices, executed_devices, export_df, terminal_statuses, job_name=None, not_submitted=()):
+    """Returns one row per tracked or executed device with its Outcome.
+
+    The three sources are indexed on device name and aligned in one outer
+    join. Outcomes, in order of precedence: verified (a Successful version
+    check), executed (its job has not reached a status in
+    `terminal_statuses` yet), failed (any other version check result),
+    missing from export (submitted by the execution stage but absent from
+    the export) and never submitted, which also covers the `not_submitted`
+    devices left out of the verification job. Only rows of this run's verification
+    job `job_name` count, so execution jobs and earlier runs cannot settle a
+    device. Export rows of devices outside the tracking and executed lists
+    are left out.
+    """
+    tracked = pd.Series(True, index=_device_index(tracking_devices), name="Tracked")
+    executed = pd.Series(True, index=_device_index(executed_devices), name="Executed")
+    export = latest_result_per_device(export_df, job_name)
+    columns = [column for column in ("Status", "Result", "Command Status") if column in export.columns]
+
+    outcomes = pd.concat([tracked, executed], axis=1).join(export[columns], how="left")
+    outcomes[["Tracked", "Executed"]] = outcomes[["Tracked", "Executed"]].fillna(False).astype(bool)
+    ignored = len(export.index.difference(outcomes.index))
+    if ignored:
+        logging.debug(f"{ignored} devices in the jobs export are neither tracked nor executed, left out.")
+
+    command_status = outcomes["Command Status"].astype("string")
+    in_export = command_status.notna().to_numpy()
+    if "Status" in outcomes.columns:
+        pending = ~outcomes["Status"].astype("string").str.strip().str.lower().isin(terminal_statuses).to_numpy()
+    else:
+        pending = np.zeros(len(outcomes), dtype=bool)
+    left_out = outcomes.index.isin(list(not_submitted))
+    outcomes["Outcome"] = pd.Categorical(np.select(
+        [in_export & (command_status == SUCCESSFUL).fillna(False).to_numpy(),
+         in_export & pending,
+         in_export,
+         outcomes["Executed"].to_numpy() & ~left_out],
+        [VERIFIED, EXECUTED, FAILED, MISSING_FROM_EXPORT],
+        default=NEVER_SUBMITTED), categories=OUTCOMES)
+    return outcomes
+
+
+def outcome_counts(outcomes):
+    return outcomes["Outcome"].value_counts(sort=False).to_dict()
+
+
+def log_outcomes(outcomes):
+    for outcome, devices in outcome_counts(outcomes).items():
+        logging.info(f"Outcome {outcome:<20} {devices:>6} devices")
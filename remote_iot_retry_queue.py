@@ -0,0 +1,117 @@
+# Persistent queue of devices to re-drive through execution and verification, with backoff and a dead-letter list
+import logging
+from contextlib import closing
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from remote_iot_store import connect
+from remote_iot_reconcile import VERIFIED, FAILED as WRONG_RESULT, MISSING_FROM_EXPORT
+
+RETRY_TABLE = "retry_queue"
+
+PENDING = "pending"
+DEAD = "dead"
+
+# Why a device was queued
+SUBMISSION_FAILED = "submission failed"
+WRONG_VERSION = "wrong version"
+NOT_IN_EXPORT = "missing from export"
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY_MINUTES = 15
+DEFAULT_MAX_DELAY_MINUTES = 12 * 60
+
+
+def ensure_schema(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {RETRY_TABLE} (
+            device_name TEXT PRIMARY KEY,
+            reason TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            next_attempt_at TEXT NOT NULL,
+            last_run TEXT,
+            last_error TEXT,
+            updated_at TEXT NOT NULL
+        )""")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_retry_due ON {RETRY_TABLE} (state, next_attempt_at)")
+
+
+def backoff(attempts, retry_config):
+    """Delay before the next attempt: base_delay_minutes doubled per failed attempt, capped at max_delay_minutes."""
+    base = retry_config.get("base_delay_minutes", DEFAULT_BASE_DELAY_MINUTES)
+    cap = retry_config.get("max_delay_minutes", DEFAULT_MAX_DELAY_MINUTES)
+    return timedelta(minutes=min(cap, base * 2 ** max(0, attempts - 1)))
+
+
+def enqueue(path, devices, reason, retry_config, run=None, error=None):
+    """Records a failure for each of `devices` and schedules its next attempt.
+
+    The attempt count grows once per pipeline run, so a device that fails
+    both submission and verification in one run is counted once. Devices
+    reaching retry.max_attempts move to the dead-letter list and are not
+    retried again.
+    """
+    devices = list(dict.fromkeys(devices))
+    if not devices:
+        return
+    max_attempts = retry_config.get("max_attempts", DEFAULT_MAX_ATTEMPTS)
+    now = datetime.now()
+    with closing(connect(path)) as conn, conn:
+        ensure_schema(conn)
+        known = {device: (attempts, state, last_run) for device, attempts, state, last_run in
+                 conn.execute(f"SELECT device_name, attempts, state, last_run FROM {RETRY_TABLE}")}
+        rows = []
+        for device in devices:
+            attempts, state, last_run = known.get(device, (0, PENDING, None))
+            if state == DEAD:
+                continue
+            if attempts == 0 or run is None or last_run != run:
+                attempts += 1
+            state = DEAD if attempts >= max_attempts else PENDING
+            if state == DEAD:
+                logging.warning(f"Giving up on {device} after {attempts} attempts ({reason}).", extra={"device": device})
+            rows.append((device, reason, attempts, state, (now + backoff(attempts, retry_config)).isoformat(timespec="seconds"),
+                         run, error, now.isoformat(timespec="seconds")))
+        conn.executemany(f"INSERT OR REPLACE INTO {RETRY_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    if rows:
+        logging.info(f"Queued {len(rows)} devices for retry ({reason}).")
+
+
+def resolve(path, devices):
+    """Removes devices that have since been verified from the queue, dead-lettered ones included."""
+    with closing(connect(path)) as conn, conn:
+        ensure_schema(conn)
+        resolved = conn.executemany(f"DELETE FROM {RETRY_TABLE} WHERE device_name = ?",
+                                    [(device,) for device in devices]).rowcount
+    if resolved > 0:
+        logging.info(f"{resolved} queued devices verified, removed from the retry queue.")
+
+
+def update_from_outcomes(path, outcomes, retry_config, run=None):
+    """Applies a reconciliation outcome table: verified devices leave the queue, failed and missing ones are queued."""
+    resolve(path, outcomes.index[outcomes["Outcome"] == VERIFIED])
+    wrong = outcomes[outcomes["Outcome"] == WRONG_RESULT]
+    for command_status, group in wrong.groupby(wrong["Command Status"].astype(str)):
+        enqueue(path, group.index, WRONG_VERSION, retry_config, run, error=command_status)
+    enqueue(path, outcomes.index[outcomes["Outcome"] == MISSING_FROM_EXPORT], NOT_IN_EXPORT, retry_config, run)
+
+
+def due_devices(path, now=None):
+    """Returns the queued devices whose backoff has passed, longest waiting first."""
+    now = (now or datetime.now()).isoformat(timespec="seconds")
+    with closing(connect(path)) as conn:
+        ensure_schema(conn)
+        rows = conn.execute(f"""
+            SELECT device_name FROM {RETRY_TABLE} WHERE state = ? AND next_attempt_at <= ?
+            ORDER BY next_attempt_at""", (PENDING, now)).fetchall()
+    return [device for (device,) in rows]
+
+
+def queued_devices(path, state=None):
+    """Returns the queue (or only the rows in `state`, e.g. DEAD for the dead-letter list) as a DataFrame."""
+    with closing(connect(path)) as conn:
+        ensure_schema(conn)
+        query = f"SELECT * FROM {RETRY_TABLE}" + (" WHERE state = ?" if state else "") + " ORDER BY next_attempt_at"
+        return pd.read_sql_query(query, conn, params=(state,) if state else None)
@@ -0,0 +1,171 @@
+# Central registry of portal element locators with fallbacks and a per-page element cache
+import logging
+import threading
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import StaleElementReferenceException
+
+# The Vaadin batch job window and its form rows
+JOB_DIALOG = "/html/body/div[2]/div[3]"
+JOB_FORM = JOB_DIALOG + "/div/div/div[3]/div/div/div[1]/div/table/tbody"
+DEVICE_PICKER = JOB_FORM + "/tr[5]/td[3]/div/div"
+JOB_WINDOW = "//div[contains(@class, 'v-window')]"
+# Context menu opened from a dashboard menu tab; the id carries a generated number
+POPUP_MENU = "//*[starts-with(@id, 'portal-') and contains(@id, '-overlays')]/div[2]/div/div"
+DASHBOARD_TABS = "/div/div[2]/div/div[2]/div/div/div/div[1]"
+
+# Logical name -> locators, tried in order. The first is the recorded absolute XPath;
+# the fallbacks avoid generated ids and deep positions by anchoring on Vaadin widget classes.
+SELECTORS = {
+    "login.username": [(By.XPATH, "//input[@type='text']"), (By.CSS_SELECTOR, "input[name='username']")],
+    "login.password": [(By.XPATH, "//input[@type='password']"), (By.CSS_SELECTOR, "input[name='password']")],
+    "dashboard.batch_jobs": [
+        (By.XPATH, "//*[@id='dashboard-menu']/div/div[4]/div[3]/span/span[2]"),
+        (By.XPATH, "//*[@id='dashboard-menu']//span[not(*)][normalize-space()='Batch Jobs']"),
+    ],
+    "devices.menu_tab": [
+        (By.XPATH, "/html/body/div[1]" + DASHBOARD_TABS + "/div/div[1]/div/div/div[2]/div/div[5]/div"),
+        (By.XPATH, "//*[starts-with(@id, 'portal-') and not(contains(@id, '-overlays'))]" + DASHBOARD_TABS
+         + "/div/div[1]/div/div/div[2]/div/div[5]/div"),
+    ],
+    "jobs.menu_tab": [
+        (By.XPATH, "/html/body/div[1]" + DASHBOARD_TABS + "/div/div/div[2]/div/div[5]/div"),
+        (By.XPATH, "//*[starts-with(@id, 'portal-') and not(contains(@id, '-overlays'))]" + DASHBOARD_TABS
+         + "/div/div/div[2]/div/div[5]/div"),
+    ],
+    "jobs.menu": [
+        (By.XPATH, "//*[@id='portal-982480788']" + DASHBOARD_TABS + "/div/div/div[2]/div/div[5]/div/span"),
+        (By.XPATH, "//*[starts-with(@id, 'portal-') and not(contains(@id, '-overlays'))]" + DASHBOARD_TABS
+         + "/div/div/div[2]/div/div[5]/div/span"),
+    ],
+    "menu.new_job": [
+        (By.XPATH, "//*[@id='portal-982480788-overlays']/div[2]/div/div/span[1]/span"),
+        (By.XPATH, POPUP_MENU + "/span[1]/span"),
+    ],
+    "menu.export_jobs": [(By.XPATH, "/html/body/div[2]/div[2]/div/div/span[5]"), (By.XPATH, POPUP_MENU + "/span[5]")],
+    "menu.export_devices": [
+        (By.XPATH, "/html/body/div[2]/div[2]/div/div/span[14]/span"),
+        (By.XPATH, POPUP_MENU + "/span[14]/span"),
+    ],
+    "job_dialog": [(By.XPATH, JOB_DIALOG), (By.XPATH, JOB_WINDOW)],
+    "job_dialog.maximize": [
+        (By.XPATH, JOB_DIALOG + "/div/div/div[2]/div[1]"),
+        (By.XPATH, JOB_WINDOW + "//div[contains(@class, 'v-window-maximizebox')]"),
+    ],
+    "job_dialog.name": [(By.XPATH, JOB_FORM + "/tr[1]/td[3]/input"), (By.XPATH, JOB_WINDOW + "//tr[1]/td[3]//input")],
+    "job_dialog.device_search": [
+        (By.XPATH, DEVICE_PICKER + "/div[3]/div/div[1]/div/input"),
+        (By.XPATH, JOB_WINDOW + "//tr[5]//input[contains(@class, 'v-textfield')]"),
+    ],
+    "job_dialog.device_search_button": [
+        (By.XPATH, DEVICE_PICKER + "/div[3]/div/div[1]/div/div/span"),
+        (By.XPATH, JOB_WINDOW + "//tr[5]//input[contains(@class, 'v-textfield')]/following-sibling::div//span"),
+    ],
+    "job_dialog.available_devices": [
+        (By.XPATH, DEVICE_PICKER + "/div[1]/div/select[1]"),
+        (By.XPATH, JOB_WINDOW + "//select[contains(@class, 'v-select-twincol-options')]"),
+    ],
+    "job_dialog.selected_devices": [
+        (By.XPATH, DEVICE_PICKER + "/div[1]/div/select[2]"),
+        (By.XPATH, JOB_WINDOW + "//select[contains(@class, 'v-select-twincol-selections')]"),
+    ],
+    "job_dialog.add_devices": [
+        (By.XPATH, DEVICE_PICKER + "/div[1]/div/div[2]/div[1]"),
+        (By.XPATH, JOB_WINDOW + "//div[contains(@class, 'v-select-twincol-buttons')]/div[1]"),
+    ],
+    "job_dialog.execute_script_option": [
+        (By.XPATH, JOB_FORM + "/tr[7]/td[3]/div/span[1]/label"),
+        (By.XPATH, JOB_WINDOW + "//tr[7]//span[contains(@class, 'v-radiobutton')][1]/label"),
+    ],
+    "job_dialog.script": [
+        (By.XPATH, JOB_FORM + "/tr[8]/td[3]/div/div/div/div/input"),
+        (By.XPATH, JOB_WINDOW + "//div[contains(@class, 'v-filterselect')]/input"),
+    ],
+    "job_dialog.script_suggestions": [(By.XPATH, "//div[contains(@class, 'v-filterselect-suggestpopup')]")],
+    "job_dialog.command": [(By.XPATH, JOB_FORM + "/tr[8]/td[3]/textarea"), (By.XPATH, JOB_WINDOW + "//textarea")],
+    "job_dialog.submit": [
+        (By.XPATH, JOB_DIALOG + "/div/div/div[3]/div/div/div[3]/div/div/div/div/div[3]/div"),
+        (By.XPATH, JOB_WINDOW + "//div[contains(@class, 'v-button')][.//span[normalize-space()='Submit']]"),
+    ],
+}
+
+# Tags the document once with a random page id and counts DOM insertions/removals from then on
+DOM_VERSION_SCRIPT = """
+    if (!window.__remoteIotDom) {
+        window.__remoteIotDom = {page: Math.random().toString(36).slice(2), version: 0};
+        new MutationObserver(function () { window.__remoteIotDom.version++; })
+            .observe(document, {childList: true, subtree: true});
+    }
+    return window.__remoteIotDom.page + ':' + window.__remoteIotDom.version;
+"""
+
+_lock = threading.Lock()
+# (session id, logical name) -> (DOM version, element)
+_cache = {}
+# logical name -> index of the locator that matched last
+_preferred = {}
+
+
+def locators(name):
+    """Returns the locators of `name`, the one that matched last first."""
+    candidates = SELECTORS[name]
+    preferred = _preferred.get(name, 0)
+    return [candidates[preferred]] + [loc for index, loc in enumerate(candidates) if index != preferred]
+
+
+def dom_version(driver):
+    return driver.execute_script(DOM_VERSION_SCRIPT)
+
+
+def _usable(element, clickable):
+    return not clickable or (element.is_displayed() and element.is_enabled())
+
+
+def lookup(driver, name, clickable=False):
+    """Returns the element registered as `name`, or False if no locator matches yet; usable as a wait condition.
+
+    A resolved element is reused until nodes are added to or removed from the
+    page. Otherwise the locators are tried in order without waiting, so a
+    broken primary locator falls through to its fallbacks on the same poll.
+    """
+    key = (driver.session_id, name)
+    version = dom_version(driver)
+    with _lock:
+        cached = _cache.get(key)
+    if cached and cached[0] == version:
+        try:
+            if _usable(cached[1], clickable):
+                return cached[1]
+        except StaleElementReferenceException:
+            pass
+
+    candidates = SELECTORS[name]
+    for loc in locators(name):
+        for element in driver.find_elements(*loc):
+            try:
+                if not _usable(element, clickable):
+                    continue
+            except StaleElementReferenceException:
+                continue
+            index = candidates.index(loc)
+            with _lock:
+                if index != _preferred.get(name, 0):
+                    logging.warning(f"Selector '{name}' matched locator #{index + 1} {loc[1]}; the recorded locator looks outdated.")
+                    _preferred[name] = index
+                _cache[key] = (version, element)
+            return element
+    return False
+
+
+def find(driver, name, timeout=10, clickable=False, poll_frequency=0.1):
+    """Waits until the element registered as `name` is present (or clickable) and returns it."""
+    return WebDriverWait(driver, timeout, poll_frequency=poll_frequency,
+                         ignored_exceptions=(StaleElementReferenceException,)).until(
+        lambda d: lookup(d, name, clickable), message=f"No locator of '{name}' matched within {timeout}s")
+
+
+def clear_cache(driver=None):
+    """Forgets resolved elements, for one driver or all of them."""
+    with _lock:
+        for key in [key for key in _cache if driver is None or key[0] == driver.session_id]:
+            del _cache[key]
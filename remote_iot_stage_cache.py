@@ -0,0 +1,129 @@
+# Memoized pipeline stages: a stage whose inputs and settings are unchanged reuses its last output
+import json
+import hashlib
+import logging
+from contextlib import closing
+from datetime import datetime
+
+import pandas as pd
+
+from remote_iot_store import connect, store_path, read_table, TRACKING_TABLE, EXECUTED_TABLE, FINAL_TABLE
+
+CACHE_TABLE = "stage_cache"
+
+STAGES = ("fetch", "execute", "verify")
+DEPENDS_ON = {"fetch": (), "execute": ("fetch",), "verify": ("execute",)}
+
+# What each stage's fingerprint covers: its config sections and the store tables it reads
+STAGE_CONFIG = {"fetch": ("script_1", "portal"), "execute": ("script_2", "portal"), "verify": ("script_3", "portal")}
+STAGE_INPUTS = {"fetch": (), "execute": (TRACKING_TABLE,), "verify": (TRACKING_TABLE, EXECUTED_TABLE)}
+# The table a stage produces; it must still be as the stage left it for the stage to be skipped
+STAGE_OUTPUT = {"fetch": TRACKING_TABLE, "execute": EXECUTED_TABLE, "verify": FINAL_TABLE}
+
+# Minutes a stage's output stays reusable unless pipeline.max_age_minutes says otherwise. The fetch
+# stage reads nothing from the store, so its fingerprint never changes and only age expires it.
+DEFAULT_MAX_AGE_MINUTES = {"fetch": 30}
+
+# Settings that change how a stage runs but not what it produces: pacing, concurrency, timeouts and
+# transport tuning. "adaptive" drops the whole adaptive batching section.
+IGNORED_SETTINGS = {"resume", "workers", "submit_interval", "batch_delay", "adaptive", "result_deadline",
+                    "download_timeout", "pool_size", "timeout", "max_search_length"}
+IGNORED_PREFIXES = ("poll_",)
+
+
+def output_settings(section_config):
+    """The settings of a config section that can change what a stage produces."""
+    return {key: value for key, value in section_config.items()
+            if key not in IGNORED_SETTINGS and not key.startswith(IGNORED_PREFIXES)}
+
+
+def ensure_schema(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CACHE_TABLE} (
+            stage TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            output_digest TEXT,
+            artifact TEXT NOT NULL,
+            completed_at TEXT NOT NULL
+        )""")
+
+
+def memoize_enabled(config):
+    return config.get("pipeline", {}).get("memoize", True)
+
+
+def forced_stages(force):
+    """Expands --force names ("all" or stage names) to those stages plus every stage downstream of them."""
+    forced = set(STAGES) if "all" in (force or ()) else set(force or ())
+    changed = True
+    while changed:
+        dependents = {stage for stage in STAGES if forced.intersection(DEPENDS_ON[stage])}
+        changed = not dependents <= forced
+        forced |= dependents
+    return forced
+
+
+def table_digest(path, name):
+    """Content hash of a store table, or None when it does not exist."""
+    df = read_table(path, name)
+    if df is None:
+        return None
+    digest = hashlib.sha256(",".join(df.columns).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def fingerprint(config, stage):
+    """Hash of the stage's settings and input tables; None when an input is missing, so the stage always runs."""
+    store = store_path(config)
+    inputs = {name: table_digest(store, name) for name in STAGE_INPUTS[stage]}
+    if None in inputs.values():
+        return None
+    settings = {section: output_settings(config.get(section, {})) for section in STAGE_CONFIG[stage]}
+    payload = json.dumps({"stage": stage, "settings": settings, "inputs": inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cached_stage(config, stage, forced=()):
+    """Returns the recorded artifact of `stage` when it can be skipped, otherwise None.
+
+    A stage is skipped when its fingerprint matches the last successful run,
+    its output table is unchanged since then and, if pipeline.max_age_minutes
+    (or DEFAULT_MAX_AGE_MINUTES) sets a limit for it, that run is recent enough.
+    """
+    if not memoize_enabled(config) or stage in forced:
+        return None
+    current = fingerprint(config, stage)
+    if current is None:
+        return None
+    store = store_path(config)
+    with closing(connect(store)) as conn:
+        ensure_schema(conn)
+        row = conn.execute(f"SELECT fingerprint, output_digest, artifact, completed_at FROM {CACHE_TABLE} WHERE stage = ?",
+                           (stage,)).fetchone()
+    if row is None or row[0] != current:
+        return None
+    if table_digest(store, STAGE_OUTPUT[stage]) != row[1]:
+        logging.info(f"Output of stage {stage} changed since it last ran, running it again.")
+        return None
+    max_age = {**DEFAULT_MAX_AGE_MINUTES, **config.get("pipeline", {}).get("max_age_minutes", {})}.get(stage)
+    age = datetime.now() - datetime.fromisoformat(row[3])
+    if max_age is not None and age.total_seconds() > max_age * 60:
+        logging.info(f"Output of stage {stage} is older than {max_age} minutes, running it again.")
+        return None
+    logging.info(f"Stage {stage} is unchanged since {row[3]}, reusing its output.")
+    return json.loads(row[2])
+
+
+def record_stage(config, stage, stage_fingerprint, **artifact):
+    """Records a successful run of `stage` under the fingerprint taken when it started."""
+    if not memoize_enabled(config) or stage_fingerprint is None:
+        return
+    store = store_path(config)
+    output_digest = table_digest(store, STAGE_OUTPUT[stage])
+    with closing(connect(store)) as conn, conn:
+        ensure_schema(conn)
+        conn.execute(f"INSERT OR REPLACE INTO {CACHE_TABLE} VALUES (?, ?, ?, ?, ?)",
+                     (stage, stage_fingerprint, output_digest, json.dumps(artifact, default=str),
+                      datetime.now().isoformat(timespec="seconds")))
+    logging.debug(f"Recorded stage {stage} with fingerprint {stage_fingerprint[:12]}.")
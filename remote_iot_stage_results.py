@@ -0,0 +1,34 @@
+# Typed results handed from one pipeline stage to the next
+from dataclasses import dataclass, field
+from typing import IO, List, Optional, Union
+
+
+@dataclass
+class FetchResult:
+    # A path, or the export itself when it was captured in memory
+    export_path: Optional[Union[str, IO[bytes]]] = None
+    tracking_path: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.tracking_path is not None
+
+
+@dataclass
+class ExecutionResult:
+    executed_devices: List[str] = field(default_factory=list)
+    batch_count: int = 0
+
+    @property
+    def ok(self):
+        return bool(self.executed_devices)
+
+
+@dataclass
+class VerificationResult:
+    jobs_file: Optional[Union[str, IO[bytes]]] = None
+    output_path: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.jobs_file is not None
@@ -0,0 +1,105 @@
+# SQLite-backed store for the device tables passed between pipeline stages
+import os
+import sqlite3
+import logging
+from contextlib import closing
+
+import pandas as pd
+
+from remote_iot_csv_stream import CHUNK_SIZE
+
+TRACKING_TABLE = "tracking_devices"
+EXECUTED_TABLE = "executed_devices"
+FINAL_TABLE = "final_execution"
+VERSION_SUMMARY_TABLE = "version_summary"
+OUTCOME_TABLE = "device_outcomes"
+
+
+def store_path(config):
+    """Returns the store file from config.json, defaulting to the stage 1 save folder."""
+    path = config.get("store", {}).get("path")
+    if not path:
+        path = os.path.join(config["script_1"]["save_path"], "remote_iot_store.sqlite")
+    return os.path.expanduser(path)
+
+
+def excel_reports_enabled(config):
+    """True when the final Excel report should be written next to the store."""
+    return config.get("store", {}).get("excel_report", True)
+
+
+def csv_chunksize(config):
+    """Rows per chunk when streaming portal CSV exports."""
+    return config.get("store", {}).get("csv_chunksize", CHUNK_SIZE)
+
+
+def intermediate_excel_enabled(config):
+    """True when the old per-stage Excel files should still be written for manual inspection."""
+    return config.get("store", {}).get("intermediate_excel", False)
+
+
+def connect(path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def write_table(path, name, df):
+    """Replaces table `name` with the contents of `df`."""
+    with closing(connect(path)) as conn, conn:
+        df.to_sql(name, conn, if_exists="replace", index=False, chunksize=5000)
+    logging.debug(f"Stored {len(df)} rows in table '{name}' ({path}).")
+
+
+def append_rows(path, name, df):
+    """Appends the rows of `df` to table `name`, creating it if needed."""
+    with closing(connect(path)) as conn, conn:
+        df.to_sql(name, conn, if_exists="append", index=False, chunksize=5000)
+
+
+def write_chunks(path, name, chunks):
+    """Replaces table `name` with the concatenation of the DataFrames in `chunks`, one chunk in memory at a time.
+
+    Returns the number of rows written.
+    """
+    rows = 0
+    with closing(connect(path)) as conn, conn:
+        for index, chunk in enumerate(chunks):
+            chunk.to_sql(name, conn, if_exists="replace" if index == 0 else "append", index=False, chunksize=5000)
+            rows += len(chunk)
+    logging.debug(f"Stored {rows} rows in table '{name}' ({path}).")
+    return rows
+
+
+def read_table(path, name, columns=None):
+    """Returns table `name` as a DataFrame, or None if the store or the table does not exist."""
+    if not os.path.exists(path):
+        return None
+    with closing(connect(path)) as conn:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)).fetchone()
+        if not exists:
+            return None
+        selected = ", ".join(f'"{column}"' for column in columns) if columns else "*"
+        return pd.read_sql_query(f'SELECT {selected} FROM "{name}"', conn)
+
+
+def read_table_chunks(path, name, chunksize=CHUNK_SIZE):
+    """Yields table `name` in DataFrames of at most `chunksize` rows; nothing if the store or the table does not exist."""
+    if not os.path.exists(path):
+        return
+    with closing(connect(path)) as conn:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)).fetchone()
+        if not exists:
+            return
+        yield from pd.read_sql_query(f'SELECT * FROM "{name}"', conn, chunksize=chunksize)
+
+
+def read_tracking_devices(config, fallback_excel):
+    """Returns the tracking list from the store, falling back to a hand-maintained Excel sheet."""
+    df = read_table(store_path(config), TRACKING_TABLE)
+    if df is None:
+        logging.info(f"No tracking table in the store, reading {fallback_excel}")
+        df = pd.read_excel(fallback_excel)
+    return df
@@ -1,44 +1,67 @@
 # Execute the script in RemoteIoT for the selected devices in general
-import os
 import logging
-from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import time
+import threading
 import pandas as pd
-from webdriver_manager.chrome import ChromeDriverManager
 import json
-
-# Define log directory (log_folder_2 in same directory as script)
-script_dir = os.path.dirname(os.path.abspath(__file__))
-log_dir = os.path.join(script_dir, "log_folder_2")
-
-# Create the log directory if it doesn't exist
-os.makedirs(log_dir, exist_ok=True)
-
-# Generate a timestamped log filename inside the log folder
-log_filename = datetime.now().strftime("%Y%m%d_%H%M%S_script2.log")
-log_file = os.path.join(log_dir, log_filename)
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler()
-    ]
-)
-logging.info("Logging initialized. Log file: %s", log_filename)
+import argparse
+from remote_iot_browser import create_driver, quit_driver
+from remote_iot_http_client import uses_http, client_from_driver, login_url
+from remote_iot_stage_results import ExecutionResult
+from remote_iot_store import (store_path, write_table, append_rows, read_table, read_tracking_devices,
+                              intermediate_excel_enabled, EXECUTED_TABLE)
+from remote_iot_checkpoint import (start_run, record_batch, done_devices, last_batch_number, SUBMITTED, UNCONFIRMED,
+                                  FAILED)
+from remote_iot_batch_scheduler import AdaptiveBatchScheduler
+from remote_iot_retry_queue import enqueue, SUBMISSION_FAILED
+from remote_iot_waits import (run_step, click, type_text, fill_text, wait_for_element, network_idle, element_present,
+                              element_clickable, overlay_closed, url_changed)
+from remote_iot_device_selection import select_devices, MAX_QUERY_LENGTH
+from remote_iot_stage_cache import fingerprint, record_stage
+from remote_iot_logging import setup_logging, set_context, log_context, current_run
+from remote_iot_profiling import start_trace, log_summary, span, timed
+
+setup_logging("execute")
 
 # Load configuration
 with open("config.json", "r") as config_file:
     config = json.load(config_file)
 
 batch_delay = config["script_2"]["batch_delay"]
+
+LOGIN_URL = login_url(config.get("portal", {}))
+
+# Guards executed_devices when several workers submit batches
+output_lock = threading.Lock()
+
+
+class SubmitUnconfirmed(Exception):
+    """The submit click went through but the job dialog did not close; the job may exist on the portal."""
+
+    def __init__(self, devices, error):
+        self.devices = devices
+        super().__init__(f"Job submitted but not confirmed: {error}")
+
+
+class RateLimiter:
+    """Spaces batch submissions at least `interval` seconds apart across all workers."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        with span("rate limit wait"):
+            time.sleep(max(0, slot - now))
+
+
 def load_credentials(file_path="credentials.conf"):
     credentials = {}
     try:
@@ -52,27 +75,27 @@ def load_credentials(file_path="credentials.conf"):
     return credentials
 
 
+@timed()
 def login(driver, username, password):
     try:
-        wait = WebDriverWait(driver, 10)
-        driver.get("https://remoteiot.com/portal/?link=login")
+        driver.get(LOGIN_URL)
 
-        username_field = wait.until(EC.presence_of_element_located((By.XPATH, "//input[@type='text']")))
+        username_field = wait_for_element(driver, "login.username")
         username_field.send_keys(username)
-        time.sleep(1)
 
-        password_field = wait.until(EC.presence_of_element_located((By.XPATH, "//input[@type='password']")))
+        password_field = wait_for_element(driver, "login.password")
         password_field.send_keys(password)
-        time.sleep(1)
 
         if password_field.get_attribute("value"):
-            password_field.send_keys(Keys.RETURN)
+            # Logged in once the login form is gone and the dashboard stopped loading
+            run_step(driver, "login", lambda: password_field.send_keys(Keys.RETURN),
+                     until=EC.all_of(EC.any_of(url_changed(LOGIN_URL), overlay_closed("login.password")), network_idle()),
+                     timeout=30)
             logging.info("Login submitted.")
         else:
             logging.error("Password field is empty!")
             return False
 
-        time.sleep(5)
         logging.info("Login successful.")
         return True
     except Exception as e:
@@ -80,95 +103,245 @@ def login(driver, username, password):
         return False
 
 
-def create_batch_job(driver, device_list, executed_devices, output_path):
+def submit_batch_job_in_browser(driver, device_list):
+    """Submits the execution job in the portal and returns the devices that were in it."""
+    click(driver, "open batch jobs", "dashboard.batch_jobs", until=element_clickable("jobs.menu"))
+
+    # Select New Job
+    click(driver, "open job menu", "jobs.menu", until=element_clickable("menu.new_job"))
+    click(driver, "new job", "menu.new_job", until=element_present("job_dialog.name"))
+
+    # Enter Job Name
+    fill_text(driver, "job name", "job_dialog.name", "IotSecurity batch job_automation_execution")
+
+    selected = select_devices(driver, device_list, config.get("portal", {}).get("max_search_length", MAX_QUERY_LENGTH))
+
+    click(driver, "execute script option", "job_dialog.execute_script_option", until=element_present("job_dialog.script"))
+
+    # Vaadin combo box: wait for the suggestion list, then pick the first entry
+    field = type_text(driver, "script name", "job_dialog.script", "eru_misc.sh",
+                      until=element_present("job_dialog.script_suggestions"))
+    run_step(driver, "choose script", lambda: field.send_keys(Keys.DOWN, Keys.RETURN),
+             until=overlay_closed("job_dialog.script_suggestions"))
+
+    click(driver, "maximize job window", "job_dialog.maximize", until=network_idle())
+
+    click(driver, "submit job", "job_dialog.submit")
+    # From here on the job may already exist, so a failure must not lead to a resubmission
     try:
-        logging.info("Creating batch job for devices: %s", device_list)
-        wait = WebDriverWait(driver, 10)
-        batch_jobs = wait.until(
-            EC.element_to_be_clickable((By.XPATH, "//*[@id='dashboard-menu']/div/div[4]/div[3]/span/span[2]")))
-        batch_jobs.click()
-        time.sleep(2)
-
-        # Select New Job
-        dropdown = wait.until(EC.element_to_be_clickable((By.XPATH,
-                                                          "//*[@id='portal-982480788']/div/div[2]/div/div[2]/div/div/div/div[1]/div/div/div[2]/div/div[5]/div/span")))
-        dropdown.click()
-        time.sleep(2)
-
-        new_job = wait.until(
-            EC.element_to_be_clickable((By.XPATH, "//*[@id='portal-982480788-overlays']/div[2]/div/div/span[1]/span")))
-        new_job.click()
-        time.sleep(5)
-
-        # Enter Job Name
-        job_name_field = wait.until(EC.presence_of_element_located(
-            (By.XPATH, "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[1]/div/table/tbody/tr[1]/td[3]/input")))
-        job_name_field.send_keys("IotSecurity batch job_automation_execution")
-        time.sleep(4)
-
-        # Execute the script
-        search_text = f'"{"|".join(device_list)}"'
-        search_box = wait.until(EC.presence_of_element_located((By.XPATH,
-                                                                "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[1]/div/table/tbody/tr[5]/td[3]/div/div/div[3]/div/div[1]/div/input")))
-        search_box.send_keys(search_text)
-        time.sleep(3)
-        search_icon = wait.until(EC.element_to_be_clickable((By.XPATH,
-                                                             "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[1]/div/table/tbody/tr[5]/td[3]/div/div/div[3]/div/div[1]/div/div/span")))
-        search_icon.click()
-        time.sleep(3)
-
-        select_devices = wait.until(
-            EC.presence_of_element_located((By.XPATH,
-                                            "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[1]/div/table/tbody/tr[5]/td[3]/div/div/div[1]/div/select[1]")))
-        select_devices.send_keys(Keys.CONTROL + "a")
-        time.sleep(5)
-        wrap_button = wait.until(
-            EC.element_to_be_clickable((By.XPATH,
-                                        "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[1]/div/table/tbody/tr[5]/td[3]/div/div/div[1]/div/div[2]/div[1]")))
-        wrap_button.click()
-        time.sleep(3)
-
-        execute_script = wait.until(EC.element_to_be_clickable((By.XPATH,
-                                                                "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[1]/div/table/tbody/tr[7]/td[3]/div/span[1]/label")))
-        execute_script.click()
-
-        script_field = wait.until(EC.presence_of_element_located((By.XPATH,
-                                                                  "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[1]/div/table/tbody/tr[8]/td[3]/div/div/div/div/input")))  # "//*[@id='gwt-uid-41']/div/div/div/input")))
-        script_field.send_keys("eru_misc.sh")
-        time.sleep(2)
-        script_field.send_keys(Keys.DOWN)
-        script_field.send_keys(Keys.RETURN)
-        time.sleep(2)
-
-        maxim_windw = wait.until(EC.element_to_be_clickable((By.XPATH,
-                                                                "/html/body/div[2]/div[3]/div/div/div[2]/div[1]")))
-        maxim_windw.click()
-        time.sleep(2)
-
-        submit_button = wait.until(EC.element_to_be_clickable((By.XPATH,
-                                                               "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[3]/div/div/div/div/div[3]/div")))
-        submit_button.click()
-        time.sleep(5)
+        run_step(driver, "confirm job", until=EC.all_of(overlay_closed("job_dialog"), network_idle()), timeout=30)
         driver.refresh()
+    except Exception as e:
+        raise SubmitUnconfirmed(selected, e) from e
+    return selected
 
-        executed_devices.extend(device_list)
+
+def save_executed_devices(executed_devices, output_path):
+    """Writes the executed devices sheet once, at the end of the stage, when intermediate Excel files are enabled."""
+    if intermediate_excel_enabled(config):
         pd.DataFrame({'Executed Devices': executed_devices}).to_excel(output_path, index=False)
-        logging.info("Batch job executed successfully.")
+
+
+def create_batch_job(driver, device_list, executed_devices, run_id, batch_number=None):
+    with log_context(batch=batch_number):
+        return _create_batch_job(driver, device_list, executed_devices, run_id, batch_number)
+
+
+def _create_batch_job(driver, device_list, executed_devices, run_id, batch_number):
+    tracking_store = store_path(config)
+    try:
+        logging.info("Creating batch job for devices: %s", device_list)
+        portal_config = config.get("portal", {})
+        with span("create_batch_job (execution)", batch=batch_number, devices=len(device_list)):
+            if uses_http(portal_config, "create_batch_job"):
+                client_from_driver(driver, portal_config).create_batch_job(
+                    "IotSecurity batch job_automation_execution", device_list, script="eru_misc.sh")
+                submitted = list(device_list)
+            else:
+                submitted = submit_batch_job_in_browser(driver, device_list)
+        status = SUBMITTED
+    except SubmitUnconfirmed as e:
+        # Verification shows whether the job ran; resume and retry skip these devices
+        logging.warning(f"Batch {batch_number}: {e}")
+        submitted, status = e.devices, UNCONFIRMED
     except Exception as e:
         logging.error("Failed to execute batch job: %s", e)
+        with output_lock:
+            record_batch(tracking_store, run_id, batch_number, device_list, FAILED, error=str(e))
+            enqueue(tracking_store, device_list, SUBMISSION_FAILED, config.get("retry", {}), current_run(), error=str(e))
+        return False
+
+    try:
+        # Devices the portal could not find were left out of the job and are retried later
+        missing = [device for device in device_list if device not in set(submitted)]
+
+        # Only the new batch is written, so each checkpoint costs the same however far the run got
+        with output_lock, span("save executed devices", batch=batch_number):
+            record_batch(tracking_store, run_id, batch_number, submitted, status)
+            append_rows(tracking_store, EXECUTED_TABLE, pd.DataFrame({'Executed Devices': submitted}))
+            executed_devices.extend(submitted)
+            if missing:
+                error = "not found by the portal's device search"
+                record_batch(tracking_store, run_id, batch_number, missing, FAILED, error=error)
+                enqueue(tracking_store, missing, SUBMISSION_FAILED, config.get("retry", {}), current_run(), error=error)
+        if status == SUBMITTED:
+            logging.info("Batch job executed successfully.")
+        return True
+    except Exception as e:
+        # The job was submitted, so these devices are not queued for resubmission
+        logging.error(f"Batch {batch_number} submitted but could not be saved: {e}")
+        return False
+
+
+def start_worker_driver():
+    """Starts a headless driver and logs it in, returning None when the login fails."""
+    creds = load_credentials()
+    worker_driver = create_driver(browser_config=config.get("browser"))
+    if not login(worker_driver, creds.get("username"), creds.get("password")):
+        quit_driver(worker_driver)
+        return None
+    return worker_driver
+
+
+def run_worker_pool(driver, scheduler, executed_devices, run_id, workers, submit_interval, worker_drivers=None):
+    """Submits the scheduler's batches using `workers` logged-in browsers.
+
+    The given driver is used as the first worker. The others come from
+    `worker_drivers` when they were started ahead of time, otherwise they are
+    started headless and logged in here. A global rate limiter replaces the
+    per-batch sleep so the portal still sees one submission per interval;
+    with adaptive scheduling the interval follows the scheduler's delay.
+    """
+    limiter = RateLimiter(submit_interval)
+    adaptive = scheduler.min_delay != scheduler.max_delay
+    ready_drivers = [driver] + [d for d in (worker_drivers or []) if d is not None]
+
+    def worker(worker_id, worker_driver):
+        try:
+            if worker_driver is None:
+                worker_driver = start_worker_driver()
+                if worker_driver is None:
+                    logging.error(f"Worker {worker_id} could not log in, leaving its batches to the other workers.")
+                    return
+
+            while True:
+                next_batch = scheduler.next_batch()
+                if next_batch is None:
+                    break
+                batch_number, batch = next_batch
+                limiter.acquire()
+                start = time.perf_counter()
+                ok = create_batch_job(worker_driver, batch, executed_devices, run_id, batch_number)
+                scheduler.record(time.perf_counter() - start, ok)
+                if adaptive:
+                    limiter.interval = scheduler.delay
+                logging.info(f"Batch {batch_number} executed by worker {worker_id}.")
+        except Exception as e:
+            logging.error(f"Worker {worker_id} stopped: {e}")
+        finally:
+            if worker_driver is not None and worker_driver is not driver:
+                quit_driver(worker_driver)
+
+    threads = [threading.Thread(target=worker,
+                                args=(worker_id, ready_drivers[worker_id - 1] if worker_id <= len(ready_drivers) else None),
+                                name=f"batch-worker-{worker_id}")
+               for worker_id in range(1, workers + 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if scheduler.remaining:
+        logging.error(f"{scheduler.remaining} devices were not submitted because no worker was available.")
+
+
+def run_stage(driver, worker_drivers=None, resume=None, devices=None):
+    """Submits the execution batch jobs with an already logged-in driver.
+
+    `worker_drivers` are extra logged-in drivers for the worker pool, for callers
+    that started them while the previous stage was still running. With `resume`
+    (default: script_2.resume in config.json) devices already submitted by the
+    last run are skipped. Batch size and spacing come from the scheduler and
+    adapt to the portal when script_2.adaptive is enabled. `devices` replaces
+    the tracking list, e.g. with the devices due in the retry queue; such a
+    run is journaled as a retry run and adds to the executed devices of the
+    last full run instead of replacing them.
+    """
+    set_context(stage="execute")
+    input_path = config["script_2"]["input_path"]
+    output_path = config["script_2"]["output_path"]
+    device_count = config["script_2"]["device_count"]
+    workers = config["script_2"].get("workers", 1)
+    if resume is None:
+        resume = config["script_2"].get("resume", False)
+    tracking_store = store_path(config)
+    # Runs on a given device list are not memoized
+    stage_fingerprint = fingerprint(config, "execute") if devices is None else None
+
+    if devices is None:
+        with span("load tracking list"):
+            df = read_tracking_devices(config, input_path)
+        device_list = df['Device Name'].tolist()[:device_count]
+    else:
+        device_list = list(devices)
+
+    retry = devices is not None
+    resume = resume and not retry
+    run_id = start_run(tracking_store, resume, retry)
+    executed_devices = done_devices(tracking_store, run_id) if resume else []
+    if executed_devices:
+        logging.info(f"Skipping {len(executed_devices)} devices already submitted in run {run_id}.")
+    elif not retry and read_table(tracking_store, EXECUTED_TABLE) is not None:
+        write_table(tracking_store, EXECUTED_TABLE, pd.DataFrame({'Executed Devices': []}))
+    done = set(executed_devices)
+    scheduler = AdaptiveBatchScheduler.from_config(
+        config["script_2"], [device for device in device_list if device not in done],
+        first_batch_number=last_batch_number(tracking_store, run_id) + 1)
+
+    if workers > 1:
+        submit_interval = config["script_2"].get("submit_interval", batch_delay)
+        logging.info(f"Submitting {scheduler.remaining} devices with {workers} workers, one batch every {submit_interval}s.")
+        run_worker_pool(driver, scheduler, executed_devices, run_id, workers, submit_interval, worker_drivers)
+    else:
+        for worker_driver in worker_drivers or []:
+            if worker_driver is not None:
+                quit_driver(worker_driver)
+
+        # Execute batches
+        while True:
+            next_batch = scheduler.next_batch()
+            if next_batch is None:
+                break
+            batch_number, batch = next_batch
+            start = time.perf_counter()
+            ok = create_batch_job(driver, batch, executed_devices, run_id, batch_number)
+            scheduler.record(time.perf_counter() - start, ok)
+            logging.info(f"Batch {batch_number} executed.")
+            # No pause after the last batch
+            if scheduler.remaining:
+                time.sleep(scheduler.delay)
+
+    if retry:
+        executed_table = read_table(tracking_store, EXECUTED_TABLE)
+        save_executed_devices(executed_table['Executed Devices'].tolist() if executed_table is not None else [],
+                              output_path)
+    else:
+        save_executed_devices(executed_devices, output_path)
+    # Only a run that submitted every device may be reused by the next one
+    if device_list and set(executed_devices) >= set(device_list):
+        record_stage(config, "execute", stage_fingerprint, batch_count=scheduler.batch_count)
+    return ExecutionResult(executed_devices=executed_devices, batch_count=scheduler.batch_count)
 
 
 def main():
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless")  # Run in headless mode
-    options.add_argument("--start-maximized")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--force-device-scale-factor=1")  # Forces 100% scale
-    options.add_argument("--high-dpi-support=1")  # Ensures high DPI support
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    parser = argparse.ArgumentParser(description="Submit the IotSecurity execution batch jobs.")
+    parser.add_argument("--resume", action="store_true", default=None,
+                        help="skip devices already submitted by the last, interrupted run")
+    args = parser.parse_args()
+
+    start_trace(config.get("profiling", {}), "script2")
+    with span("start browser"):
+        driver = create_driver(browser_config=config.get("browser"))
 
     creds = load_credentials()
     username = creds.get("username")
@@ -180,26 +353,12 @@ def main():
 
     if not login(driver, username, password):
         logging.critical("Login failed! Terminating script.")
-        driver.quit()
+        quit_driver(driver)
         return
 
-    input_path = config["script_2"]["input_path"]
-    output_path = config["script_2"]["output_path"]
-    device_count = config["script_2"]["device_count"]
-
-    df = pd.read_excel(input_path)
-    device_list = df['Device Name'].tolist()
-    executed_devices = []
-    batch_size = 10 if device_count >= 100 else 5
-    total_devices = len(device_list)
-
-    # Execute batches
-    for i in range(0, min(device_count, total_devices), batch_size):
-        batch = device_list[i:i + batch_size]
-        create_batch_job(driver, batch, executed_devices, output_path)
-        logging.info(f"Batch {i // batch_size + 1} executed.")
-        time.sleep(batch_delay)
-    driver.quit()
+    run_stage(driver, resume=args.resume)
+    quit_driver(driver)
+    log_summary()
     logging.info("Script execution completed successfully.")
     print("2nd_script_completed")
 
@@ -4,46 +4,28 @@ import pandas as pd
 import logging
 import json
 import ast
-from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.action_chains import ActionChains
-from webdriver_manager.chrome import ChromeDriverManager
-
-# Define log directory (log_folder_3 in same directory as script)
-script_dir = os.path.dirname(os.path.abspath(__file__))
-log_dir = os.path.join(script_dir, "log_folder_3")
-
-# Create the log directory if it doesn't exist
-os.makedirs(log_dir, exist_ok=True)
-
-# Generate a timestamped log filename inside the log folder
-log_filename = datetime.now().strftime("%Y%m%d_%H%M%S_script3.log")
-log_file = os.path.join(log_dir, log_filename)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler()
-    ]
-)
-
-logging.info("Logging initialized. Log file: %s", log_filename)
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler()
-    ]
-)
+from remote_iot_browser import create_driver, quit_driver
+from remote_iot_download_watcher import DownloadWatcher
+from remote_iot_export_capture import ExportCapture, capture_enabled
+from remote_iot_http_client import uses_http, client_from_driver, login_url
+from remote_iot_stage_results import VerificationResult
+from remote_iot_store import (store_path, write_table, write_chunks, read_table, read_table_chunks, read_tracking_devices,
+                              csv_chunksize, excel_reports_enabled, intermediate_excel_enabled, TRACKING_TABLE, FINAL_TABLE,
+                              EXECUTED_TABLE, VERSION_SUMMARY_TABLE, OUTCOME_TABLE)
+from remote_iot_csv_stream import read_csv_chunks, JOBS_DTYPES
+from remote_iot_versions import classify_command_status, version_counts, summary_from_counts, log_version_summary
+from remote_iot_reconcile import reconcile, log_outcomes, CONCLUSIVE_OUTCOMES
+from remote_iot_retry_queue import update_from_outcomes
+from remote_iot_waits import (run_step, click, fill_text, wait_for_element, network_idle, element_present,
+                              element_clickable, overlay_closed, url_changed)
+from remote_iot_device_selection import select_devices, MAX_QUERY_LENGTH
+from remote_iot_stage_cache import fingerprint, record_stage
+from remote_iot_logging import setup_logging, set_context, current_run
+from remote_iot_profiling import start_trace, log_summary, span, timed, record_retry
+
+setup_logging("verify")
 
 # Load configuration
 try:
@@ -54,9 +36,20 @@ except Exception as e:
     logging.error(f"Failed to load config.json: {e}")
     exit(1)
 
+LOGIN_URL = login_url(config.get("portal", {}))
+
 EXPECTED_VERSIONS = {
     "Expected_output": "1.0.0"
 }
+# Releases accepted as up to date; config.json can list several during a rollout
+EXPECTED_VERSIONS_LIST = config["script_3"].get("expected_versions", list(EXPECTED_VERSIONS.values()))
+
+# Prints the installed IoTSecurity release on the device
+VERSION_COMMAND = "grep -oP 'IoTSecurity_\\K[0-9]+\\.[0-9]+\\.[0-9]+' /home/pi/IoTSecurity/security-release.version | head -1 || echo 0.0.0"
+
+# Job statuses after which a device will not report anything new
+TERMINAL_STATUSES = {status.lower() for status in config["script_3"].get(
+    "terminal_statuses", ["Executed", "Failed", "Error", "Timeout", "Cancelled", "Expired"])}
 
 
 def load_credentials(file_path="credentials.conf"):
@@ -88,54 +81,40 @@ def get_latest_downloaded_file(download_dir):
         return None
 
 
-def wait_for_file_download_complete(download_dir, timeout=60):
-    """Waits until the file starting with `base_filename` is fully downloaded."""
-    end_time = time.time() + timeout
-    logging.info("Waiting for jobs CSV to be fully downloaded...")
+@timed("jobs export download")
+def wait_for_file_download_complete(download_dir, timeout=60, watcher=None):
+    """Waits until a new jobs CSV is fully downloaded into `download_dir`.
 
-    while time.time() < end_time:
-        all_files = os.listdir(download_dir)
-        # Filter files: containing 'jobs', ends with .csv, and no .crdownload
-        jobs_files = [
-            os.path.join(download_dir, f)
-            for f in all_files
-            if "jobs" in f.lower() and f.lower().endswith(".csv") and not f.endswith(".crdownload")
-        ]
-
-        if jobs_files:
-            latest_file = max(jobs_files, key=os.path.getctime)
-            try:
-                with open(latest_file, 'r', encoding='utf-8') as f:
-                    f.read(10)  # Try to read few bytes
-                logging.info(f"Job file download completed: {latest_file}")
-                return latest_file
-            except Exception as e:
-                logging.debug(f"File not ready yet: {e}")
-
-        time.sleep(1)
-
-    logging.error("Timeout: jobs.csv not downloaded completely within expected time.")
-    return None
+    Pass a watcher that was started before the export was triggered; without
+    one only files that appear after this call are considered.
+    """
+    logging.info("Waiting for jobs CSV to be fully downloaded...")
+    if watcher is None:
+        watcher = DownloadWatcher(download_dir, "*jobs*.csv").start()
+    try:
+        return watcher.wait(timeout=timeout)
+    finally:
+        watcher.stop()
 
 
+@timed()
 def login(driver, username, password):
     try:
-        wait = WebDriverWait(driver, 10)
-        driver.get("https://remoteiot.com/portal/?link=login")
-        username_field = wait.until(EC.presence_of_element_located((By.XPATH, "//input[@type='text']")))
+        driver.get(LOGIN_URL)
+        username_field = wait_for_element(driver, "login.username")
         username_field.send_keys(username)
-        time.sleep(1)
-        password_field = wait.until(EC.presence_of_element_located((By.XPATH, "//input[@type='password']")))
+        password_field = wait_for_element(driver, "login.password")
         password_field.send_keys(password)
-        time.sleep(1)
 
         if password_field.get_attribute("value"):
-            password_field.send_keys(Keys.RETURN)
+            # Logged in once the login form is gone and the dashboard stopped loading
+            run_step(driver, "login", lambda: password_field.send_keys(Keys.RETURN),
+                     until=EC.all_of(EC.any_of(url_changed(LOGIN_URL), overlay_closed("login.password")), network_idle()),
+                     timeout=30)
         else:
             logging.error("Error: Password field is empty!")
             return False
 
-        time.sleep(5)
         logging.info("Login successful.")
         return True
     except Exception as e:
@@ -143,144 +122,288 @@ def login(driver, username, password):
         return False
 
 
-def create_batch_job(driver, device_list):
+def verification_job_name():
+    """Name of this run's version check job; exports are filtered on it so other jobs and earlier runs are ignored."""
+    return f"IotSecurity {current_run()}"
+
+
+def submit_batch_job_in_browser(driver, device_list, job_name):
+    """Submits the version check job in the portal and returns the devices that were in it."""
+    click(driver, "open batch jobs", "dashboard.batch_jobs", until=element_clickable("jobs.menu"))
+    click(driver, "open job menu", "jobs.menu", until=element_clickable("menu.new_job"))
+    click(driver, "new job", "menu.new_job", until=element_present("job_dialog.name"))
+
+    fill_text(driver, "job name", "job_dialog.name", job_name)
+
+    # The whole tracking list goes into this job, so it is searched in chunks; devices the
+    # portal cannot find are left out of it
+    selected = select_devices(driver, device_list, config.get("portal", {}).get("max_search_length", MAX_QUERY_LENGTH))
+
+    # Enter command Name
+    fill_text(driver, "command", "job_dialog.command", VERSION_COMMAND)
+
+    # Scroll down to make the submit button visible
+    button = wait_for_element(driver, "job_dialog.submit")
+    run_step(driver, "scroll to submit",
+             lambda: driver.execute_script("arguments[0].scrollIntoView();", button),
+             until=EC.visibility_of(button))
+
+    # Click Submit
+    click(driver, "submit job", "job_dialog.submit", until=EC.all_of(overlay_closed("job_dialog"), network_idle()), timeout=30)
+    return selected
+
+
+@timed("create_batch_job (verification)")
+def create_batch_job(driver, device_list, job_name):
+    """Creates the version check job and returns the devices it covers, or None when it could not be created."""
     try:
-        logging.info("Creating batch job...")
-        wait = WebDriverWait(driver, 10)
-
-        batch_jobs = wait.until(
-            EC.element_to_be_clickable((By.XPATH, "//*[@id='dashboard-menu']/div/div[4]/div[3]/span/span[2]")))
-        batch_jobs.click()
-        time.sleep(2)
-
-        dropdown = wait.until(EC.element_to_be_clickable((By.XPATH,
-                                                          "//*[@id='portal-982480788']/div/div[2]/div/div[2]/div/div/div/div[1]/div/div/div[2]/div/div[5]/div/span")))
-        dropdown.click()
-        time.sleep(2)
-
-        new_job = wait.until(
-            EC.element_to_be_clickable((By.XPATH, "//*[@id='portal-982480788-overlays']/div[2]/div/div/span[1]/span")))
-        new_job.click()
-        time.sleep(5)
-
-        job_name_field = wait.until(EC.presence_of_element_located(
-            (By.XPATH, "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[1]/div/table/tbody/tr[1]/td[3]/input")))
-        job_name_field.send_keys("IotSecurity")
-        time.sleep(4)
-
-        search_text = f'"{"|".join(device_list)}"'
-        search_box = wait.until(EC.presence_of_element_located((By.XPATH,
-                                                                "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[1]/div/table/tbody/tr[5]/td[3]/div/div/div[3]/div/div[1]/div/input")))
-        search_box.send_keys(search_text)
-        time.sleep(3)
-        search_icon = wait.until(EC.element_to_be_clickable((By.XPATH,
-                                                             "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[1]/div/table/tbody/tr[5]/td[3]/div/div/div[3]/div/div[1]/div/div/span")))
-        search_icon.click()
-        time.sleep(3)
-
-        # Select all listed devices
-        select_devices = wait.until(
-            EC.presence_of_element_located((By.XPATH,
-                                            "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[1]/div/table/tbody/tr[5]/td[3]/div/div/div[1]/div/select[1]")))
-        select_devices.send_keys(Keys.CONTROL + "a")
-        time.sleep(2)
-        # Click Wrap Button
-        wrap_button = wait.until(
-            EC.element_to_be_clickable((By.XPATH,
-                                        "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[1]/div/table/tbody/tr[5]/td[3]/div/div/div[1]/div/div[2]/div[1]")))
-        wrap_button.click()
-
-        time.sleep(2)
-
-        # Verify Selected Devices
-        wait.until(EC.presence_of_element_located((By.XPATH,
-                                                   "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[1]/div/table/tbody/tr[5]/td[3]/div/div/div[1]/div/select[2]")))
-
-        # Enter command Name
-        script_field = wait.until(EC.presence_of_element_located(
-            (By.XPATH, "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[1]/div/table/tbody/tr[8]/td[3]/textarea")))
-        script_field.send_keys(
-            "grep -oP 'IoTSecurity_\\K[0-9]+\\.[0-9]+\\.[0-9]+' /home/pi/IoTSecurity/security-release.version | head -1 || echo 0.0.0")
-        time.sleep(2)  # Wait for the dropdown to appear
-
-        # Scroll down to make the submit button visible
-        submit_button = wait.until(EC.presence_of_element_located(
-            (By.XPATH, "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[3]/div/div/div/div/div[3]/div")))
-
-        # Method 1: Scroll using JavaScript
-        driver.execute_script("arguments[0].scrollIntoView();", submit_button)
-        time.sleep(2)  # Allow time for scrolling
-
-        # Method 2: Scroll using ActionChains (Alternative)
-        actions = ActionChains(driver)
-        actions.move_to_element(submit_button).perform()
-        time.sleep(3)
-
-        # Click Submit
-        wait.until(EC.element_to_be_clickable(
-            (By.XPATH, "/html/body/div[2]/div[3]/div/div/div[3]/div/div/div[3]/div/div/div/div/div[3]/div"))).click()
-
-        time.sleep(300)  # 300 -- 5 minutes
-
-        menu_tab = wait.until(EC.element_to_be_clickable(
-            (By.XPATH, "/html/body/div[1]/div/div[2]/div/div[2]/div/div/div/div[1]/div/div/div[2]/div/div[5]/div")))
-        menu_tab.click()
-        time.sleep(2)
-
-        export_table = wait.until(EC.element_to_be_clickable((By.XPATH, "/html/body/div[2]/div[2]/div/div/span[5]")))
-        export_table.click()
-        time.sleep(5)
-
-        logging.info("Batch job successfully created.")
+        logging.info(f"Creating batch job '{job_name}'...")
+        portal_config = config.get("portal", {})
+        if uses_http(portal_config, "create_batch_job"):
+            client_from_driver(driver, portal_config).create_batch_job(job_name, device_list, command=VERSION_COMMAND)
+            submitted = list(device_list)
+        else:
+            submitted = submit_batch_job_in_browser(driver, device_list, job_name)
+
+        logging.info(f"Batch job successfully created for {len(submitted)} of {len(device_list)} devices.")
+        return submitted
     except Exception as e:
         logging.error(f"Error creating batch job: {e}")
+        return None
 
 
-def update_output_file(output_path, new_file_path):
+def export_jobs_table(driver, download_dir, timeout=60):
+    """Exports the jobs table and returns the path of the downloaded CSV (or the export captured in memory), or None."""
+    portal_config = config.get("portal", {})
+    if uses_http(portal_config, "export_jobs"):
+        try:
+            return client_from_driver(driver, portal_config).save_export("jobs_export", download_dir, "jobs")
+        except Exception as e:
+            logging.error(f"Error exporting jobs table over HTTP: {e}")
+            return None
+
+    capture = capture_enabled(config.get("browser"))
+    # The capture takes the export from the network log, or the download if its body is unavailable
+    watcher = (ExportCapture(driver, download_dir, "*jobs*.csv") if capture
+               else DownloadWatcher(download_dir, "*jobs*.csv"))
     try:
-        df = pd.read_csv(output_path)
-
-        def parse_result(result):
+        watcher.start()
+        click(driver, "open jobs menu", "jobs.menu_tab", until=element_clickable("menu.export_jobs"))
+        click(driver, "export jobs", "menu.export_jobs")
+    except Exception as e:
+        watcher.stop()
+        logging.error(f"Error exporting jobs table: {e}")
+        return None
+    if capture:
+        try:
+            with span("jobs export capture"):
+                return watcher.wait(timeout=timeout)
+        finally:
+            watcher.stop()
+    return wait_for_file_download_complete(download_dir, timeout=timeout, watcher=watcher)
+
+
+def is_verification_job(job_name):
+    """Row filter keeping only the rows of the job named exactly `job_name`; exports without a Job Name column are taken as a whole."""
+    def condition(chunk):
+        if "Job Name" not in chunk.columns:
+            return pd.Series(True, index=chunk.index)
+        return (chunk["Job Name"].astype("string").str.strip() == job_name).fillna(False).astype(bool)
+    return condition
+
+
+def pending_devices(jobs_file, device_list, job_name):
+    """Returns the devices from `device_list` whose row in the `job_name` job has not reached a terminal status."""
+    pending = set(device_list)
+    for chunk in read_csv_chunks(jobs_file, columns=("Device Name", "Status", "Job Name"), dtype=JOBS_DTYPES,
+                                 where=is_verification_job(job_name), chunksize=csv_chunksize(config)):
+        finished = chunk["Status"].astype(str).str.strip().str.lower().isin(TERMINAL_STATUSES)
+        pending.difference_update(chunk.loc[finished, "Device Name"])
+    return pending
+
+
+@timed()
+def poll_job_results(driver, device_list, download_dir, job_name, deadline=300, initial_delay=5, max_delay=60):
+    """Re-exports the jobs table on a doubling backoff until every device is done or `deadline` seconds pass.
+
+    Returns the most recent jobs export, which is used for the results even
+    when some devices never reached a terminal status.
+    """
+    end_time = time.monotonic() + deadline
+    delay = initial_delay
+    latest_file = None
+
+    while True:
+        time.sleep(max(0, min(delay, end_time - time.monotonic())))
+        jobs_file = export_jobs_table(driver, download_dir)
+        if jobs_file:
+            latest_file = jobs_file
             try:
-                if not isinstance(result, str):
-                    result = str(result)
-                result = result.strip()
-
-                if not result:  # Empty result
-                    return "Failed"
-                if result == EXPECTED_VERSIONS.get("Expected_output"):
-                    return "Successful"
-                else:
-                    return "Failed"
+                pending = pending_devices(jobs_file, device_list, job_name)
             except Exception as e:
-                logging.error(f"Error parsing result: {e}")
-                return "Failed"
-
-        def determine_status(row):
-            if row.get("Status", "").lower() != "executed":
-                return "Failed"
-            return parse_result(row.get("Result", ""))
-
-        df["Command Status"] = df.apply(determine_status, axis=1)
-        df.to_excel(new_file_path, index=False)
-        logging.info(f"Updated output file saved at: {new_file_path}")
+                logging.error(f"Error reading jobs export: {e}")
+                pending = set(device_list)
+            if not pending:
+                logging.info("All devices reported a final job status.")
+                return latest_file
+            logging.info(f"{len(pending)} of {len(device_list)} devices still running, next check in {min(delay * 2, max_delay)}s.")
+        record_retry("poll_job_results")
+
+        if time.monotonic() >= end_time:
+            logging.warning(f"Result deadline of {deadline}s reached, using the latest jobs export.")
+            return latest_file
+        delay = min(delay * 2, max_delay)
+
+
+def classified_chunks(output_path, tally, job_name):
+    """Yields the `job_name` rows of the jobs export classified chunk by chunk.
+
+    No chunk is kept: `tally` collects the running version counts under
+    "counts" and the last row per device (the summary columns only) under
+    "latest", so memory follows the fleet size rather than the export size.
+    """
+    tally.setdefault("counts", None)
+    tally.setdefault("latest", None)
+    for chunk in read_csv_chunks(output_path, columns=config["script_3"].get("report_columns") or None,
+                                 dtype=JOBS_DTYPES, where=is_verification_job(job_name), chunksize=csv_chunksize(config)):
+        chunk = chunk.copy()
+        chunk["Command Status"] = classify_command_status(chunk, EXPECTED_VERSIONS_LIST)
+        counts = version_counts(chunk)
+        tally["counts"] = counts if tally["counts"] is None else tally["counts"].add(counts, fill_value=0)
+        latest = chunk[[column for column in ("Job Name", "Device Name", "Status", "Result", "Command Status")
+                        if column in chunk.columns]]
+        if tally["latest"] is not None:
+            latest = pd.concat([tally["latest"], latest], ignore_index=True)
+        tally["latest"] = latest.drop_duplicates("Device Name", keep="last")
+        yield chunk
+
+
+@timed()
+def update_output_file(output_path, new_file_path, job_name):
+    """Classifies the `job_name` rows of the jobs export into the final table.
+
+    Returns Job Name, Device Name, Status, Result and Command Status of the
+    last row per device, which is what reconciliation uses.
+    """
+    try:
+        store = store_path(config)
+        tally = {}
+        write_chunks(store, FINAL_TABLE, classified_chunks(output_path, tally, job_name))
+        if tally["latest"] is None:
+            logging.warning(f"The jobs export has no rows of job '{job_name}'.")
+            return None
+        df = tally["latest"]
+
+        summary = summary_from_counts(tally["counts"])
+        log_version_summary(summary)
+        write_table(store, VERSION_SUMMARY_TABLE, summary)
+        if excel_reports_enabled(config):
+            with pd.ExcelWriter(new_file_path) as writer:
+                # The Devices sheet is copied from the store a chunk at a time
+                row = 0
+                for chunk in read_table_chunks(store, FINAL_TABLE, csv_chunksize(config)):
+                    chunk.to_excel(writer, sheet_name="Devices", index=False, header=row == 0, startrow=row)
+                    row += len(chunk) + (row == 0)
+                summary.to_excel(writer, sheet_name="Version Summary", index=False)
+            logging.info(f"Updated output file saved at: {new_file_path}")
+        return df
     except Exception as e:
         logging.error(f"Error updating output file: {e}")
+        return None
+
+
+@timed()
+def reconcile_devices(tracking_devices, output_df, report_path, job_name, retry=False, not_submitted=()):
+    """Joins the tracking list, the executed devices and the classified export into the per-device outcome table.
+
+    Verified devices leave the retry queue; failed and missing ones are queued.
+    With `retry` only the executed devices in `tracking_devices` count, as the
+    executed table also holds the last full run's devices. `not_submitted`
+    are the devices left out of the verification job.
+    """
+    store = store_path(config)
+    executed = read_table(store, EXECUTED_TABLE)
+    executed_devices = executed["Executed Devices"] if executed is not None else pd.Series(dtype="string")
+    if retry:
+        executed_devices = executed_devices[executed_devices.isin(tracking_devices)]
+    outcomes = reconcile(tracking_devices, executed_devices, output_df, TERMINAL_STATUSES, job_name, not_submitted)
+    log_outcomes(outcomes)
+    write_table(store, OUTCOME_TABLE, outcomes.reset_index())
+    update_from_outcomes(store, outcomes, config.get("retry", {}), current_run())
+    if excel_reports_enabled(config) and os.path.exists(report_path):
+        with pd.ExcelWriter(report_path, mode="a", engine="openpyxl", if_sheet_exists="replace") as writer:
+            outcomes.reset_index().to_excel(writer, sheet_name="Outcomes", index=False)
+    return outcomes
+
+
+def run_stage(driver, devices=None):
+    """Verifies the installed version on the tracked devices with an already logged-in driver.
+
+    `devices` replaces the tracking list, e.g. with the devices due in the retry queue.
+    """
+    set_context(stage="verify")
+    input_path = config["script_3"]["input_path"]
+    download_dir = os.path.expanduser(config["script_3"]["download_dir"])
+    new_output_path = config["script_3"]["new_output_path"]
+    tracking_store = store_path(config)
+    # Taken before the processed devices are removed from the tracking list below
+    stage_fingerprint = fingerprint(config, "verify") if devices is None else None
+
+    if devices is None:
+        with span("load tracking list"):
+            df = read_tracking_devices(config, input_path)
+    else:
+        df = pd.DataFrame({'Device Name': list(devices)})
+    device_list = df['Device Name'].tolist()
+
+    latest_file = None
+    left_out = []
+    job_name = verification_job_name()
+    submitted = create_batch_job(driver, device_list, job_name)
+    if submitted:
+        # Only the devices that made it into the job are waited on
+        left_out = [device for device in device_list if device not in set(submitted)]
+        # latest_file = get_latest_downloaded_file(download_dir)
+        latest_file = poll_job_results(driver, submitted, download_dir, job_name,
+                                       deadline=config["script_3"].get("result_deadline", 300),
+                                       initial_delay=config["script_3"].get("poll_initial_delay", 5),
+                                       max_delay=config["script_3"].get("poll_max_delay", 60))
+    if latest_file:
+        logging.info(f"Processing latest file: {latest_file}")
+        output_df = update_output_file(latest_file, new_output_path, job_name)
+        if output_df is not None:
+            record_stage(config, "verify", stage_fingerprint, jobs_file=str(latest_file), output_path=new_output_path)
+            with span("reconcile devices"):
+                outcomes = reconcile_devices(df['Device Name'], output_df, new_output_path, job_name,
+                                             retry=devices is not None, not_submitted=left_out)
+            settled = outcomes.index[outcomes["Outcome"].isin(CONCLUSIVE_OUTCOMES)]
+            # A run on given devices still settles them on the stored tracking list
+            tracking_df = df if devices is None else read_table(tracking_store, TRACKING_TABLE)
+            if tracking_df is None:
+                tracking_df = df
+
+            # Pending, missing and never submitted devices stay on the tracking list for the next run
+            logging.info(f"Removed {len(settled)} devices from tracking file.")
+            try:
+                updated_tracking_df = tracking_df[~tracking_df['Device Name'].isin(settled)]
+                write_table(tracking_store, TRACKING_TABLE, updated_tracking_df)
+                if intermediate_excel_enabled(config):
+                    tracking_file = os.path.join(config["script_1"]["save_path"], "Tracking_online_Devices.xlsx")
+                    updated_tracking_df.to_excel(tracking_file, index=False)
+                logging.info("Processed devices removed from the tracking list.")
+            except Exception as e:
+                logging.error(f"Error updating Tracking file: {e}")
+    else:
+        logging.warning("No valid result file found!")
+    return VerificationResult(jobs_file=latest_file, output_path=new_output_path if latest_file else None)
 
 
 def main():
     logging.info("Starting script execution...")
+    start_trace(config.get("profiling", {}), "script3")
 
-    options = webdriver.ChromeOptions()
-    # options.add_argument("--headless")  # Run in headless mode
-    options.add_argument("--start-maximized")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--force-device-scale-factor=1")  # Forces 100% scale
-    options.add_argument("--high-dpi-support=1")  # Ensures high DPI support
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    with span("start browser"):
+        driver = create_driver(browser_config=config.get("browser"))
 
     creds = load_credentials()
     username = creds["username"]
@@ -288,58 +411,16 @@ def main():
 
     if not login(driver, username, password):
         logging.error("Login failed!")
-        driver.quit()
+        quit_driver(driver)
         return
 
     try:
-        input_path = config["script_3"]["input_path"]
-        download_dir = os.path.expanduser(config["script_3"]["download_dir"])
-        new_output_path = config["script_3"]["new_output_path"]
-
-        df = pd.read_excel(input_path)
-        device_list = df['Device Name'].tolist()
-
-        create_batch_job(driver, device_list)
-        time.sleep(10)
-
-        # latest_file = get_latest_downloaded_file(download_dir)
-        latest_file = wait_for_file_download_complete(download_dir)
-        if latest_file:
-            logging.info(f"Processing latest file: {latest_file}")
-            update_output_file(latest_file, new_output_path)
-            filtered_df = df[df['Job Name'].str.contains('IotSecurity', na=False)]
-            filtered_df.to_excel(new_output_path, index=False)
-
-            # Now reload and get processed devices
-            output_df = pd.read_excel(new_output_path)
-            processed_devices = output_df['Device Name'].dropna().unique().tolist()
-
-            # Now safely log
-            logging.info(f"Removed {len(processed_devices)} devices from tracking file.")
-            # Remove processed devices from Tracking_online_Devices.xlsx
-            try:
-                tracking_file = os.path.join(config["script_1"]["save_path"], "Tracking_online_Devices.xlsx")
-                if os.path.exists(tracking_file):
-                    tracking_df = pd.read_excel(tracking_file)
-                    output_df = pd.read_excel(new_output_path)
-
-                    processed_devices = output_df['Device Name'].dropna().unique().tolist()
-                    updated_tracking_df = tracking_df[~tracking_df['Device Name'].isin(processed_devices)]
-
-                    # Save the updated tracking sheet
-                    updated_tracking_df.to_excel(tracking_file, index=False)
-                    logging.info("Processed devices removed from Tracking_online_Devices.xlsx")
-                else:
-                    logging.warning(f"Tracking file not found: {tracking_file}")
-            except Exception as e:
-                logging.error(f"Error updating Tracking file: {e}")
-        else:
-            logging.warning("No valid result file found!")
-
+        run_stage(driver)
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
     finally:
-        driver.quit()
+        quit_driver(driver)
+        log_summary()
         logging.info("Script execution completed.")
         print("3rd_script_completed")
 
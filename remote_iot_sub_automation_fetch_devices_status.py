@@ -1,40 +1,24 @@
 import os
-import time
 import logging
-import glob
 import json
-import pandas as pd
-from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-
-# Define log directory (log_folder_1 in same directory as script)
-script_dir = os.path.dirname(os.path.abspath(__file__))
-log_dir = os.path.join(script_dir, "log_folder_1")
-
-# Create the log directory if it doesn't exist
-os.makedirs(log_dir, exist_ok=True)
-
-# Generate a timestamped log filename inside the log folder
-log_filename = datetime.now().strftime("%Y%m%d_%H%M%S_script1.log")
-log_file = os.path.join(log_dir, log_filename)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler()
-    ]
-)
-
-logging.info("Logging initialized. Log file: %s", log_filename)
+from remote_iot_browser import create_driver, quit_driver
+from remote_iot_download_watcher import DownloadWatcher
+from remote_iot_export_capture import ExportCapture, capture_enabled
+from remote_iot_http_client import uses_http, client_from_driver, login_url
+from remote_iot_stage_results import FetchResult
+from remote_iot_store import (store_path, write_chunks, read_table, csv_chunksize, intermediate_excel_enabled,
+                              TRACKING_TABLE)
+from remote_iot_csv_stream import csv_columns, read_csv_chunks, DEVICE_DTYPES
+from remote_iot_device_sync import sync_export, read_devices
+from remote_iot_waits import (run_step, click, wait_for_element, network_idle, element_clickable, overlay_closed,
+                              url_changed)
+from remote_iot_stage_cache import fingerprint, record_stage
+from remote_iot_logging import setup_logging, set_context
+from remote_iot_profiling import start_trace, log_summary, span, timed
+
+setup_logging("fetch")
 
 # Load configuration
 try:
@@ -45,6 +29,8 @@ except Exception as e:
     logging.error(f"Error loading configuration: {e}")
     exit(1)
 
+LOGIN_URL = login_url(config.get("portal", {}))
+
 
 def load_credentials(file_path="credentials.conf"):
     credentials = {}
@@ -60,28 +46,30 @@ def load_credentials(file_path="credentials.conf"):
     return credentials
 
 
+@timed()
 def login(driver, username, password):
     try:
-        wait = WebDriverWait(driver, 10)
-        driver.get("https://remoteiot.com/portal/?link=login")
+        driver.get(LOGIN_URL)
         logging.info("Navigated to login page.")
 
-        username_field = wait.until(EC.presence_of_element_located((By.XPATH, "//input[@type='text']")))
+        username_field = wait_for_element(driver, "login.username")
         username_field.send_keys(username)
         logging.debug("Entered username.")
 
-        password_field = wait.until(EC.presence_of_element_located((By.XPATH, "//input[@type='password']")))
+        password_field = wait_for_element(driver, "login.password")
         password_field.send_keys(password)
         logging.debug("Entered password.")
 
         if password_field.get_attribute("value"):
-            password_field.send_keys(Keys.RETURN)
+            # Logged in once the login form is gone and the dashboard stopped loading
+            run_step(driver, "login", lambda: password_field.send_keys(Keys.RETURN),
+                     until=EC.all_of(EC.any_of(url_changed(LOGIN_URL), overlay_closed("login.password")), network_idle()),
+                     timeout=30)
             logging.info("Submitted login form.")
         else:
             logging.error("Password field is empty!")
             return False
 
-        time.sleep(5)
         logging.info("Login successful.")
         return True
     except Exception as e:
@@ -89,26 +77,40 @@ def login(driver, username, password):
         return False
 
 
+@timed()
 def download_device_list(driver, download_path):
+    portal_config = config.get("portal", {})
+    if uses_http(portal_config, "download_device_list"):
+        try:
+            return client_from_driver(driver, portal_config).save_export("devices_export", download_path, "Devices")
+        except Exception as e:
+            logging.error(f"Error downloading device list over HTTP: {e}")
+            return None
+
     try:
-        wait = WebDriverWait(driver, 10)
-        menu_button = wait.until(EC.element_to_be_clickable((By.XPATH,
-                                                             "/html/body/div[1]/div/div[2]/div/div[2]/div/div/div/div[1]/div/div[1]/div/div/div[2]/div/div[5]/div")))
-        menu_button.click()
+        click(driver, "open device menu", "devices.menu_tab", until=element_clickable("menu.export_devices"))
         logging.info("Navigated to device menu.")
 
-        time.sleep(5)
-        export_button = wait.until(EC.element_to_be_clickable((By.XPATH, "/html/body/div[2]/div[2]/div/div/span[14]/span")))
-        export_button.click()
-        logging.info("Clicked export button.")
-
-        time.sleep(10)  # Wait for download to complete
-        downloaded_files = sorted(glob.glob(os.path.join(download_path, "Devices*.csv")), key=os.path.getmtime,
-                                  reverse=True)
-
-        if downloaded_files:
+        export_button = wait_for_element(driver, "menu.export_devices", clickable=True)
+        timeout = config["script_1"].get("download_timeout", 60)
+        if capture_enabled(config.get("browser")):
+            # Takes the export from the network log, or the download if its body is unavailable
+            with ExportCapture(driver, download_path, "Devices*.csv") as capture:
+                export_button.click()
+                logging.info("Clicked export button.")
+                with span("device export capture"):
+                    downloaded_file = capture.wait(timeout=timeout)
+        else:
+            # Start watching before the click so older exports in the folder are ignored
+            with DownloadWatcher(download_path, "Devices*.csv") as watcher:
+                export_button.click()
+                logging.info("Clicked export button.")
+                with span("device export download"):
+                    downloaded_file = watcher.wait(timeout=timeout)
+
+        if downloaded_file:
             logging.info("Device list download completed.")
-            return downloaded_files[0]
+            return downloaded_file
         else:
             logging.warning("Download failed. No file found.")
             return None
@@ -117,45 +119,79 @@ def download_device_list(driver, download_path):
         return None
 
 
+def is_online(chunk):
+    return chunk["Status"].str.lower() == "online"
+
+
+@timed()
 def filter_offline_devices(file_path, save_path):
     try:
-        df = pd.read_csv(file_path)  # Load CSV instead of XLSX
+        columns = csv_columns(file_path)
         logging.info("Device list loaded successfully.")
     except Exception as e:
         logging.error(f"Error loading file: {e}")
-        return
+        return None
 
-    if "Status" not in df.columns:
+    if "Status" not in columns:
         logging.warning("Column 'Status' not found in downloaded file.")
-        return
+        return None
 
-    df_offline = df[df["Status"].str.lower() == "online"]
-    offline_path = os.path.join(save_path, "Tracking_online_Devices.xlsx")
+    tracking_store = store_path(config)
+    chunksize = csv_chunksize(config)
+    if config["script_1"].get("sync_mode", "full") == "incremental":
+        # Apply only changed export rows; optionally hand downstream stages just the changed devices.
+        # Whole rows are kept here because the sync hashes every column; devices missing from the
+        # export are marked as removed.
+        try:
+            chunks = read_csv_chunks(file_path, dtype=DEVICE_DTYPES, chunksize=chunksize)
+            changed_df = sync_export(tracking_store, chunks)
+            df = changed_df if config["script_1"].get("changed_only", False) else read_devices(tracking_store)
+        except Exception as e:
+            logging.error(f"Error syncing device table: {e}")
+            return None
+        if df.empty:
+            logging.info("No device changes since the last sync.")
+            df = changed_df
+        online_chunks = [df[is_online(df)]]
+    else:
+        # Stream the export straight into the tracking table, keeping only online devices
+        online_chunks = read_csv_chunks(file_path, columns=config["script_1"].get("tracking_columns") or None,
+                                        dtype=DEVICE_DTYPES, where=is_online, chunksize=chunksize)
 
     try:
-        df_offline.to_excel(offline_path, index=False)
-        logging.info(f"Offline devices saved to: {offline_path}")
+        rows = write_chunks(tracking_store, TRACKING_TABLE, online_chunks)
+        logging.info(f"{rows} online devices saved to: {tracking_store}")
+        if intermediate_excel_enabled(config):
+            offline_path = os.path.join(save_path, "Tracking_online_Devices.xlsx")
+            read_table(tracking_store, TRACKING_TABLE).to_excel(offline_path, index=False)
+            logging.info(f"Offline devices also written to: {offline_path}")
+        return tracking_store
     except Exception as e:
         logging.error(f"Error saving offline devices: {e}")
+        return None
 
 
-def main():
+def run_stage(driver):
+    """Downloads the device list with an already logged-in driver and saves the online devices."""
+    set_context(stage="fetch")
     download_path = os.path.expanduser(config["script_1"]["download_path"])  # Path to downloads folder
     save_path = config["script_1"]["save_path"]
+    stage_fingerprint = fingerprint(config, "fetch")
+
+    file_path = download_device_list(driver, download_path)
+    if not file_path:
+        return FetchResult()
+    result = FetchResult(export_path=file_path, tracking_path=filter_offline_devices(file_path, save_path))
+    if result.ok:
+        record_stage(config, "fetch", stage_fingerprint, tracking_path=result.tracking_path)
+    return result
 
+
+def main():
     logging.info("Starting script execution.")
+    start_trace(config.get("profiling", {}), "script1")
     try:
-        options = webdriver.ChromeOptions()
-        #options.add_argument("--headless")  # Run in headless mode
-        options.add_argument("--start-maximized")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--window-size=1920,1080")
-        options.add_argument("--force-device-scale-factor=1")  # Forces 100% scale
-        options.add_argument("--high-dpi-support=1")  # Ensures high DPI support
-        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-        logging.info("WebDriver initialized.")
+        driver = create_driver(browser_config=config.get("browser"))
     except Exception as e:
         logging.error(f"Error initializing WebDriver: {e}")
         return
@@ -165,11 +201,10 @@ def main():
     password = creds.get("password", "")
 
     if login(driver, username, password):
-        file_path = download_device_list(driver, download_path)
-        if file_path:
-            filter_offline_devices(file_path, save_path)
+        run_stage(driver)
 
-    driver.quit()
+    quit_driver(driver)
+    log_summary()
     logging.info("Script execution completed.")
     print("1st_script_completed")
 
@@ -0,0 +1,138 @@
+# Multi-tenant mode: the full pipeline for several RemoteIoT accounts in parallel, isolated runs
+import os
+import sys
+import copy
+import json
+import shutil
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from remote_iot_store import read_table, write_table, FINAL_TABLE
+from remote_iot_logging import current_run, RUN_ID_ENV
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+SUCCESS_MARKER = "All scripts executed successfully!"
+MERGED_TABLE = "tenant_final_execution"
+
+
+def _merge(base, overrides):
+    merged = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def tenant_config(base_config, tenant, workdir):
+    """Returns config.json for one tenant: every download, output and store path points into `workdir`.
+
+    Settings under the tenant's "overrides" are merged on top, e.g. a
+    different portal base_url or device_count.
+    """
+    config = _merge({key: value for key, value in base_config.items() if key != "tenants"}, tenant.get("overrides", {}))
+    downloads = os.path.join(workdir, "downloads")
+    tracking_file = os.path.join(workdir, "Tracking_online_Devices.xlsx")
+
+    config["script_1"].update(download_path=downloads, save_path=workdir)
+    config["script_2"].update(input_path=tracking_file, output_path=os.path.join(workdir, "Script_Execution_Device_List.xlsx"))
+    config["script_3"].update(input_path=tracking_file, download_dir=downloads,
+                              new_output_path=os.path.join(workdir, "Final Execution List.xlsx"))
+    config.setdefault("store", {})["path"] = os.path.join(workdir, "remote_iot_store.sqlite")
+    config.setdefault("profiling", {})["trace_dir"] = os.path.join(workdir, "traces")
+    config.setdefault("logging", {})["log_dir"] = os.path.join(workdir, "logs")
+
+    browser = config.setdefault("browser", {})
+    browser["download_dir"] = downloads
+    browser["profile_dir"] = os.path.join(workdir, "browser_profiles")
+    # The resolved chromedriver is the same for every tenant
+    browser["driver_cache"] = os.path.abspath(os.path.expanduser(browser.get("driver_cache", "chromedriver_cache.json")))
+    return config
+
+
+def prepare_tenant(base_config, tenant, base_dir):
+    """Creates the tenant's working directory with its own config.json and credentials.conf."""
+    workdir = os.path.abspath(os.path.join(os.path.expanduser(base_dir), tenant["name"]))
+    os.makedirs(os.path.join(workdir, "downloads"), exist_ok=True)
+    with open(os.path.join(workdir, "config.json"), "w") as config_file:
+        json.dump(tenant_config(base_config, tenant, workdir), config_file, indent=2)
+
+    credentials_path = os.path.join(workdir, "credentials.conf")
+    if tenant.get("credentials_file"):
+        shutil.copyfile(os.path.expanduser(tenant["credentials_file"]), credentials_path)
+    else:
+        with open(credentials_path, "w") as cred_file:
+            cred_file.write(f"username={tenant['username']}\npassword={tenant['password']}\n")
+    return workdir
+
+
+def run_tenant(name, workdir, resume=False, force=()):
+    """Runs the in-process pipeline for one tenant inside its working directory; True when every stage succeeded."""
+    command = [sys.executable, MAIN_SCRIPT, "--in-process"] + (["--resume"] if resume else [])
+    for stage in force:
+        command += ["--force", stage]
+    log_path = os.path.join(workdir, "run.log")
+    logging.info(f"Tenant {name}: starting pipeline in {workdir}")
+    # The tenant's log records carry the parent run id with the tenant name appended
+    env = {**os.environ, RUN_ID_ENV: f"{current_run()}-{name}"}
+    with open(log_path, "w") as log_file:
+        process = subprocess.run(command, cwd=workdir, stdout=log_file, stderr=subprocess.STDOUT, env=env)
+    with open(log_path, "r", errors="replace") as log_file:
+        ok = process.returncode == 0 and SUCCESS_MARKER in log_file.read()
+    logging.info(f"Tenant {name}: {'completed' if ok else 'FAILED'} (log: {log_path})")
+    return ok
+
+
+def merge_reports(tenant_dirs, output_dir):
+    """Combines every tenant's final table into one report with a Tenant column and a per-tenant status summary."""
+    frames = []
+    for name, workdir in tenant_dirs.items():
+        df = read_table(os.path.join(workdir, "remote_iot_store.sqlite"), FINAL_TABLE)
+        if df is None:
+            logging.warning(f"Tenant {name}: no final table to merge.")
+            continue
+        df.insert(0, "Tenant", name)
+        frames.append(df)
+    if not frames:
+        logging.error("No tenant produced a final table.")
+        return None
+
+    merged = pd.concat(frames, ignore_index=True, sort=False)
+    summary = merged.pivot_table(index="Tenant", columns="Command Status", values="Device Name",
+                                 aggfunc="count", fill_value=0)
+    summary["Total"] = summary.sum(axis=1)
+    summary = summary.reset_index()
+
+    os.makedirs(output_dir, exist_ok=True)
+    write_table(os.path.join(output_dir, "remote_iot_tenants.sqlite"), MERGED_TABLE, merged)
+    report_path = os.path.join(output_dir, "Final Execution List (all tenants).xlsx")
+    with pd.ExcelWriter(report_path) as writer:
+        summary.to_excel(writer, sheet_name="Summary", index=False)
+        merged.to_excel(writer, sheet_name="Devices", index=False)
+    for row in summary.itertuples(index=False):
+        logging.info(f"Tenant {row.Tenant}: {row.Total} devices in the final report.")
+    logging.info(f"Merged tenant report saved at: {report_path}")
+    return report_path
+
+
+def run_tenants(config, resume=False, force=()):
+    """Runs every account under tenants.accounts in parallel and writes the merged report; returns {tenant: ok}."""
+    tenants_config = config.get("tenants", {})
+    accounts = tenants_config.get("accounts", [])
+    if not accounts:
+        logging.error("No tenants configured under tenants.accounts in config.json.")
+        return {}
+    base_dir = tenants_config.get("base_dir", "tenants")
+    tenant_dirs = {tenant["name"]: prepare_tenant(config, tenant, base_dir) for tenant in accounts}
+
+    max_parallel = tenants_config.get("max_parallel", len(accounts))
+    with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="tenant") as pool:
+        futures = {name: pool.submit(run_tenant, name, workdir, resume, force) for name, workdir in tenant_dirs.items()}
+        results = {name: future.result() for name, future in futures.items()}
+
+    merge_reports(tenant_dirs, os.path.abspath(os.path.expanduser(base_dir)))
+    return results
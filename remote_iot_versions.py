@@ -0,0 +1,83 @@
+# Vectorized classification of the version check output in the jobs export
+import logging
+
+import numpy as np
+import pandas as pd
+
+SUCCESSFUL = "Successful"
+NEWER = "Newer"
+OLDER = "Older"
+MISSING = "Missing"
+ERROR = "Error"
+FAILED = "Failed"
+
+COMMAND_STATUSES = [SUCCESSFUL, NEWER, OLDER, MISSING, ERROR, FAILED]
+
+# The version command echoes this when the release file is absent
+MISSING_VERSION = "0.0.0"
+
+VERSION_PATTERN = r"^\s*(\d+)\.(\d+)\.(\d+)\s*$"
+
+
+def version_keys(versions):
+    """Returns one sortable integer per version string (NaN where it is not MAJOR.MINOR.PATCH)."""
+    parts = pd.Series(versions, dtype="string").str.extract(VERSION_PATTERN).astype("float64")
+    return parts[0] * 1_000_000 + parts[1] * 1_000 + parts[2]
+
+
+def classify_command_status(df, expected_versions):
+    """Returns the Command Status of every jobs export row without a per-row Python call.
+
+    Rows whose job did not reach "Executed" are Failed. Executed rows are
+    Missing when the device reported no release, Error when the output is
+    not a version, Successful when it matches one of `expected_versions`
+    and otherwise Newer or Older than the newest expected version.
+    """
+    status = df.get("Status", pd.Series("", index=df.index)).astype("string").str.strip().str.lower()
+    result = df.get("Result", pd.Series("", index=df.index)).astype("string").str.strip()
+
+    keys = version_keys(result).to_numpy()
+    expected = version_keys(list(expected_versions)).dropna().to_numpy()
+    newest = expected.max() if len(expected) else np.nan
+
+    executed = (status == "executed").fillna(False).to_numpy()
+    missing = (result.isna() | (result == "") | (result == MISSING_VERSION)).fillna(True).to_numpy()
+    parsed = ~np.isnan(keys)
+
+    categories = np.select(
+        [~executed, missing, ~parsed, np.isin(keys, expected), keys > newest],
+        [FAILED, MISSING, ERROR, SUCCESSFUL, NEWER],
+        default=OLDER,
+    )
+    return pd.Series(pd.Categorical(categories, categories=COMMAND_STATUSES), index=df.index, name="Command Status")
+
+
+def version_counts(df):
+    """Returns the row count per reported version and Command Status; counts of several chunks add up."""
+    reported = df["Result"].astype("string").str.strip().where(df["Command Status"].isin([SUCCESSFUL, NEWER, OLDER]))
+    return (
+        pd.DataFrame({"Version": reported.fillna("-"), "Command Status": df["Command Status"].astype(str)})
+        .groupby(["Version", "Command Status"], observed=True)
+        .size()
+    )
+
+
+def summary_from_counts(counts):
+    """Turns (summed) version_counts into the version summary, largest group first."""
+    summary = (
+        counts.astype("int64")
+        .reset_index(name="Devices")
+        .sort_values("Devices", ascending=False, kind="stable")
+    )
+    summary["Share"] = (summary["Devices"] / max(int(summary["Devices"].sum()), 1)).round(4)
+    return summary.reset_index(drop=True)
+
+
+def version_summary(df):
+    """Returns the device count per reported version and Command Status, largest group first."""
+    return summary_from_counts(version_counts(df))
+
+
+def log_version_summary(summary):
+    for row in summary.itertuples(index=False):
+        logging.info(f"Version {row.Version:<10} {row[1]:<10} {row.Devices:>6} devices ({row.Share:.1%})")
@@ -0,0 +1,125 @@
+# Condition-based wait/step engine used instead of fixed time.sleep calls
+import time
+import logging
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from remote_iot_profiling import record, span
+from remote_iot_selectors import lookup, locators, find
+
+POLL_FREQUENCY = 0.1
+
+# Sets an input's value in one call and fires the events a typing user would, so the widget syncs it
+SET_VALUE_SCRIPT = """
+    var element = arguments[0];
+    var setter = Object.getOwnPropertyDescriptor(Object.getPrototypeOf(element), 'value').set;
+    setter.call(element, arguments[1]);
+    ['input', 'keyup', 'change'].forEach(function (type) {
+        element.dispatchEvent(new Event(type, {bubbles: true}));
+    });
+"""
+
+
+class network_idle:
+    """Condition that holds once the page has loaded and no request has started for `quiet_period` seconds.
+
+    Uses the Vaadin client's own activity flag when the portal exposes it,
+    otherwise watches the resource timing buffer for new entries.
+    """
+
+    SCRIPT = """
+        if (document.readyState !== 'complete') { return -1; }
+        if (window.vaadin && window.vaadin.clients) {
+            for (var id in window.vaadin.clients) {
+                if (window.vaadin.clients[id].isActive()) { return -1; }
+            }
+        }
+        return performance.getEntriesByType('resource').length;
+    """
+
+    def __init__(self, quiet_period=0.3):
+        self.quiet_period = quiet_period
+        self._last_count = None
+        self._since = None
+
+    def __call__(self, driver):
+        count = driver.execute_script(self.SCRIPT)
+        now = time.monotonic()
+        if count < 0 or count != self._last_count:
+            self._last_count = count
+            self._since = now
+            return False
+        return now - self._since >= self.quiet_period
+
+
+# Element arguments are either a (By, value) locator or a logical name from remote_iot_selectors
+
+
+def element_present(target):
+    if isinstance(target, str):
+        return lambda driver: lookup(driver, target)
+    return EC.presence_of_element_located(target)
+
+
+def element_clickable(target):
+    if isinstance(target, str):
+        return lambda driver: lookup(driver, target, clickable=True)
+    return EC.element_to_be_clickable(target)
+
+
+def overlay_closed(target):
+    """Condition that holds once no element at `target` is displayed; for a name, under none of its locators."""
+    if isinstance(target, str):
+        return EC.all_of(*(EC.invisibility_of_element_located(loc) for loc in locators(target)))
+    return EC.invisibility_of_element_located(target)
+
+
+def url_changed(url):
+    return EC.url_changes(url)
+
+
+def run_step(driver, name, action=None, until=None, timeout=10):
+    """Runs `action`, then waits until the `until` condition holds and records how long the step took."""
+    start = time.perf_counter()
+    ok = False
+    try:
+        result = action() if action else None
+        if until is not None:
+            WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(until)
+        ok = True
+        return result
+    finally:
+        elapsed = time.perf_counter() - start
+        record(name, elapsed, ok)
+        logging.debug(f"Step '{name}' took {elapsed:.2f}s")
+
+
+def wait_for_element(driver, target, timeout=10, clickable=False):
+    """Returns the element at `target` once it is present (or clickable)."""
+    if isinstance(target, str):
+        return find(driver, target, timeout, clickable, poll_frequency=POLL_FREQUENCY)
+    condition = EC.element_to_be_clickable(target) if clickable else EC.presence_of_element_located(target)
+    return WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(condition)
+
+
+def click(driver, name, target, until=None, timeout=10):
+    """Waits for `target` to be clickable, clicks it and waits for the step's completion condition."""
+    with span(f"{name} lookup"):
+        element = wait_for_element(driver, target, timeout, clickable=True)
+    run_step(driver, name, element.click, until, timeout)
+    return element
+
+
+def type_text(driver, name, target, text, until=None, timeout=10):
+    """Waits for `target` to be present, types `text` into it and waits for the step's completion condition."""
+    with span(f"{name} lookup"):
+        element = wait_for_element(driver, target, timeout)
+    run_step(driver, name, lambda: element.send_keys(text), until, timeout)
+    return element
+
+
+def fill_text(driver, name, target, text, until=None, timeout=10):
+    """Like type_text, but sets the whole value through JavaScript instead of sending it key by key."""
+    with span(f"{name} lookup"):
+        element = wait_for_element(driver, target, timeout)
+    run_step(driver, name, lambda: driver.execute_script(SET_VALUE_SCRIPT, element, text), until, timeout)
+    return element
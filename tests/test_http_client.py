@@ -0,0 +1,102 @@
+# HTTP transport against the local mock portal: login, exports, batch jobs and client cleanup
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "bench"))
+
+import remote_iot_http_client as http_client  # noqa: E402
+from remote_iot_browser import quit_driver  # noqa: E402
+from mock_portal import start_mock_portal, SESSION_COOKIE  # noqa: E402
+
+
+class FakeDriver:
+    """Stands in for a logged-in WebDriver: a session id and the portal's session cookie."""
+
+    def __init__(self, session_id, cookies=()):
+        self.session_id = session_id
+        self.cookies = list(cookies)
+        self.quit_called = False
+
+    def get_cookies(self):
+        return self.cookies
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture
+def portal():
+    server, base_url, state = start_mock_portal(latency=0, fleet_size=20, job_latency=0, failure_ratio=0)
+    yield base_url, state
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(portal):
+    base_url, _ = portal
+    client = http_client.PortalHttpClient(base_url, pool_size=2, timeout=5)
+    assert client.login("user", "password")
+    yield client
+    client.close()
+
+
+def test_login_sets_session_cookie(client):
+    assert client.session.cookies.get(SESSION_COOKIE) == "1"
+
+
+def test_export_devices(client, portal):
+    _, state = portal
+    devices = client.export_devices()
+    assert list(devices.columns) == ["Device Name", "Status", "Group"]
+    assert devices["Device Name"].tolist() == [name for name, _ in state.devices]
+
+
+def test_create_batch_job_and_export_jobs(client):
+    assert client.create_batch_job("IotSecurity test", ["device-00001", "device-00002"], command="version") == \
+        {"status": "created"}
+    jobs = client.export_jobs()
+    assert jobs["Job Name"].unique().tolist() == ["IotSecurity test"]
+    assert jobs["Device Name"].tolist() == ["device-00001", "device-00002"]
+    assert jobs["Result"].astype(str).tolist() == ["1.0.0", "1.0.0"]
+
+
+def test_save_export(client, tmp_path):
+    path = client.save_export("devices_export", str(tmp_path / "downloads"), "Devices")
+    assert os.path.dirname(path) == str(tmp_path / "downloads")
+    assert os.path.basename(path).startswith("Devices_") and path.endswith(".csv")
+    with open(path, encoding="utf-8") as f:
+        assert f.readline().strip() == "Device Name,Status,Group"
+
+
+def test_client_from_driver_reuses_browser_cookies(portal):
+    base_url, _ = portal
+    login = http_client.PortalHttpClient(base_url, timeout=5)
+    login.login("user", "password")
+    cookies = [{"name": cookie.name, "value": cookie.value, "domain": cookie.domain, "path": cookie.path}
+               for cookie in login.session.cookies]
+    login.close()
+
+    driver = FakeDriver("session-1", cookies)
+    client = http_client.client_from_driver(driver, {"base_url": base_url, "timeout": 5})
+    try:
+        assert http_client.client_from_driver(driver, {"base_url": base_url}) is client
+        assert len(client.export_devices()) == 20
+    finally:
+        http_client.close_client(driver)
+
+
+def test_quit_driver_closes_its_client(portal):
+    base_url, _ = portal
+    driver = FakeDriver("session-2")
+    http_client.client_from_driver(driver, {"base_url": base_url})
+    assert "session-2" in http_client._clients
+
+    quit_driver(driver)
+    assert "session-2" not in http_client._clients
+    assert driver.quit_called